@@ -1,15 +1,30 @@
+import importlib.util
 import os
+import threading
 import time
-import sqlite3
-from datetime import datetime
-from typing import Tuple, Optional
 
-import pandas as pd
 import streamlit as st
-from PIL import Image, ImageOps
 
-# Your classifier must return: (bool_is_bottle, predictions_list of tuples (id, label, prob))
-from model.classifier import is_bottle
+# Heavy modules (pandas, numpy/PIL via model.classifier, streamlit-webrtc) are
+# imported inside the capture and admin views that use them, so the start
+# screen renders without them. The model itself loads in a background thread
+# (see the end of this script).
+from database.repository import (
+    init_db, ensure_ticket_row, create_user, record_capture, claim_one_ticket, redeem_tickets,
+    set_history_image, cached_dashboard_state, cached_redemptions, redemptions_page, start_rollover_scheduler,
+)
+from database.bulk import adjust_points, import_users, iter_rows, rejected_csv
+from database.reports import (
+    EXPORTS, daily_counts, iter_csv, leaderboard, monthly_counts, outstanding_tickets, outstanding_totals,
+    search_users,
+)
+from storage.archive import get_archiver
+from monitoring.metrics import (
+    counter_value, histogram_summary, inc, register_collector, render_prometheus, span, start_http_server,
+)
+from monitoring.profiling import (
+    allow_url_profiling, profile_run, recent_profiles, request_profile, url_profiling_allowed,
+)
 
 # ---------------- CONFIG ----------------
 st.set_page_config(page_title="EcoBottle Colombo", page_icon="♻️", layout="centered")
@@ -30,233 +45,20 @@ st.markdown(
 )
 
 DATA_DIR   = "data"
-IMG_DIR    = "images"
 ASSETS_DIR = "assets"
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(IMG_DIR, exist_ok=True)
-os.makedirs(ASSETS_DIR, exist_ok=True)
 
-DB_PATH          = os.path.join(DATA_DIR, "recycle.db")
-IMG_PATH_CAPTURE = os.path.join(IMG_DIR, "step1.jpg")
 THANKS_IMG       = os.path.join(ASSETS_DIR, "thanks_earth.png")
 
 AUTO_RESET_SECS  = 20
 ADMIN_PASSCODE   = os.getenv("ADMIN_PASSCODE", "teacher123")  # cámbialo en prod
-
-# ---------------- DB LAYER ----------------
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    # Users & points
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            points INTEGER NOT NULL DEFAULT 0
-        )
-    """)
-    # Claimable tickets & monthly control
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS tickets (
-            user_id TEXT PRIMARY KEY,
-            available INTEGER NOT NULL DEFAULT 0,         -- unredeemed balance
-            claimed_month INTEGER NOT NULL DEFAULT 0,     -- claimed this month
-            month_key TEXT NOT NULL DEFAULT '',           -- 'YYYY-MM'
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
-    # Redemption log (teacher uses)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS redemptions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            qty INTEGER NOT NULL,
-            admin_note TEXT,
-            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
-    # Capture history (optional)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            valid INTEGER NOT NULL,
-            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def ensure_ticket_row(user_id: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM tickets WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    if not row:
-        cur.execute("INSERT INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, 0, 0, '')", (user_id,))
-        conn.commit()
-    conn.close()
-
-def get_user(user_id: str) -> Optional[Tuple[str, int]]:
-    if not user_id:
-        return None
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT name, points FROM users WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row
-
-def create_user(user_id: str, name: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT OR IGNORE INTO users (id, name) VALUES (?, ?)", (user_id, name))
-    conn.commit()
-    conn.close()
-    ensure_ticket_row(user_id)
-
-def get_points(user_id: str) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT points FROM users WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row else 0
-
-def add_point(user_id: str, n: int = 1):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET points = points + ? WHERE id = ?", (n, user_id))
-    conn.commit()
-    conn.close()
-
-def push_history(user_id: str, valid: bool):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO history (user_id, valid) VALUES (?, ?)", (user_id, int(valid)))
-    conn.commit()
-    conn.close()
-
-def get_ticket_info(user_id: str) -> Tuple[int, int, str]:
-    """Return (available, claimed_month, month_key)."""
-    ensure_ticket_row(user_id)
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT available, claimed_month, month_key FROM tickets WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return (0, 0, "")
-    return row[0], row[1], row[2]
-
-def set_ticket_info(user_id: str, available: int, claimed_month: int, month_key: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE tickets SET available=?, claimed_month=?, month_key=? WHERE user_id=?",
-        (available, claimed_month, month_key, user_id)
-    )
-    conn.commit()
-    conn.close()
-
-def ensure_month_reset(user_id: str):
-    """Reset claimed_month if month changed."""
-    available, claimed_month, month_key = get_ticket_info(user_id)
-    current_key = datetime.now().strftime("%Y-%m")
-    if month_key != current_key:
-        set_ticket_info(user_id, available, 0, current_key)
-
-def claimable_tickets_now(user_id: str) -> int:
-    """How many tickets can be claimed now: min(points//15, 3 - claimed_this_month)."""
-    ensure_month_reset(user_id)
-    points = get_points(user_id)
-    available, claimed_month, _ = get_ticket_info(user_id)
-    by_points = points // 15
-    by_limit  = max(0, 3 - claimed_month)  # max 3 / month
-    return max(0, min(by_points, by_limit))
-
-def claim_one_ticket(user_id: str) -> bool:
-    """Try to claim 1 ticket (cost 15 points). Return True if success."""
-    ensure_month_reset(user_id)
-    if claimable_tickets_now(user_id) <= 0:
-        return False
-    # deduct 15 points and add 1 ticket + increment claimed_month
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    # deduct points
-    cur.execute("UPDATE users SET points = points - 15 WHERE id = ? AND points >= 15", (user_id,))
-    if cur.rowcount == 0:
-        conn.rollback()
-        conn.close()
-        return False
-    # update tickets
-    cur.execute("SELECT available, claimed_month, month_key FROM tickets WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.rollback()
-        conn.close()
-        return False
-    available, claimed_month, month_key = row
-    current_key = datetime.now().strftime("%Y-%m")
-    if month_key != current_key:
-        claimed_month = 0
-        month_key = current_key
-    available += 1
-    claimed_month += 1
-    cur.execute(
-        "UPDATE tickets SET available=?, claimed_month=?, month_key=? WHERE user_id=?",
-        (available, claimed_month, month_key, user_id)
-    )
-    conn.commit()
-    conn.close()
-    return True
-
-def redeem_tickets(user_id: str, qty: int, admin_note: str = "") -> bool:
-    """Teacher redeem `qty` tickets from student's available balance."""
-    if qty <= 0:
-        return False
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT available FROM tickets WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False
-    available = row[0]
-    if available < qty:
-        conn.close()
-        return False
-    # deduct available
-    cur.execute("UPDATE tickets SET available = available - ? WHERE user_id = ?", (qty, user_id))
-    # log redemption
-    cur.execute("INSERT INTO redemptions (user_id, qty, admin_note) VALUES (?, ?, ?)", (user_id, qty, admin_note))
-    conn.commit()
-    conn.close()
-    return True
-
-def redemptions_for_user(user_id: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT ts, qty, admin_note FROM redemptions WHERE user_id = ? ORDER BY ts DESC", (user_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+REPORT_CACHE_TTL_SECS = float(os.getenv("RECYCLE_REPORT_CACHE_TTL_SECS", "30"))
 
 # -------------- UTILS --------------
-def unique_filename(prefix: str, ext: str = "jpg") -> str:
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    return os.path.join(IMG_DIR, f"{prefix}_{ts}.{ext}")
-
 def go(view: str):
     st.session_state.step = view
     st.rerun()
 
-def reset_to_start(delay_secs: int = 0):
-    if delay_secs:
-        with st.spinner(f"Returning in {delay_secs} s..."):
-            time.sleep(delay_secs)
+def reset_to_start():
     st.session_state.update({
         "login_id": "",
         "temp_user_id": "",
@@ -267,15 +69,55 @@ def reset_to_start(delay_secs: int = 0):
     })
     st.rerun()
 
-def is_plastic_bottle_from_predictions(predictions) -> bool:
-    """Heuristic: accept 'water_bottle' or any '*bottle*' excluding wine/beer."""
-    labels = [lbl.lower() for _, lbl, _ in predictions]
-    if any("water_bottle" in lbl for lbl in labels):
-        return True
-    for lbl in labels:
-        if "bottle" in lbl and "wine" not in lbl and "beer" not in lbl:
-            return True
-    return False
+def flash(message: str, icon: str = "✅"):
+    """Queue a toast for the next run (survives the st.rerun() that follows)."""
+    st.session_state.flash = (message, icon)
+
+def show_flash():
+    message = st.session_state.pop("flash", None)
+    if message:
+        st.toast(message[0], icon=message[1])
+
+def pager(key: str, fetch, columns):
+    """Show one keyset page from fetch(cursor) -> Page with Prev/Next; returns its rows."""
+    import pandas as pd
+
+    stack = st.session_state.setdefault(key, [None])  # cursors of the pages seen so far
+    page = fetch(stack[-1])
+    if page.rows:
+        st.dataframe(pd.DataFrame(page.rows, columns=columns), hide_index=True, use_container_width=True)
+    if len(stack) > 1 or page.cursor is not None:
+        prev, nxt = st.columns(2)
+        if prev.button("◀ Previous", key=f"{key}_prev", disabled=len(stack) == 1, use_container_width=True):
+            stack.pop()
+            st.rerun()
+        if nxt.button("Next ▶", key=f"{key}_next", disabled=page.cursor is None, use_container_width=True):
+            stack.append(page.cursor)
+            st.rerun()
+    return page.rows
+
+_REPORTS = {
+    "leaderboard": leaderboard, "monthly": monthly_counts, "daily": daily_counts,
+    "outstanding": outstanding_tickets, "outstanding_totals": outstanding_totals,
+}
+
+@st.cache_data(ttl=REPORT_CACHE_TTL_SECS, max_entries=256, show_spinner=False)
+def report(name: str, *args):
+    """An admin report query, shared by reruns for REPORT_CACHE_TTL_SECS (idle reruns issue no SQL)."""
+    return _REPORTS[name](*args)
+
+@st.fragment(run_every=AUTO_RESET_SECS)
+def thanks_auto_reset():
+    """Reset timer for the thank-you screen.
+
+    The browser re-triggers this fragment every AUTO_RESET_SECS, so no server
+    thread sleeps while the screen waits. Buttons here rerun only the fragment.
+    """
+    if st.button("Finish / Back to start", use_container_width=True):
+        reset_to_start()
+    if time.time() >= st.session_state.get("reset_at", 0) - 1:
+        reset_to_start()
+    st.caption(f"This screen will reset in {AUTO_RESET_SECS} seconds.")
 
 # -------------- STATE --------------
 def ss_init():
@@ -291,20 +133,37 @@ def ss_init():
         "admin_ok": False,
         "admin_id_query": "",
         "admin_note": "",
+        "admin_selected": "",
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
 
-# -------------- INIT --------------
-init_db()
-ss_init()
+# -------------- METRICS --------------
+@register_collector
+def _validation_gauges():
+    accepted = counter_value("validations_total", result="accepted")
+    rejected = counter_value("validations_total", result="rejected")
+    total = accepted + rejected
+    return {("validation_accept_ratio", ()): accepted / total if total else 0.0}
 
-# -------------- ROUTER --------------
-# Top nav: tiny links for user/admin
+# -------------- INIT --------------
+@st.cache_resource(show_spinner=False)
+def init_process():
+    """Once per server process, not on every rerun."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    init_db()
+    start_http_server()  # no-op unless METRICS_PORT is set
+    start_rollover_scheduler()  # monthly ticket-claim reset
+    return True
 
+init_process()
+ss_init()
+show_flash()
 
-if st.session_state.step == "start":
+# -------------- VIEWS --------------
+def view_start():
     st.title("♻️ EcoBottle 💧 Colombo")
     st.caption("Simple and friendly prototype")
 
@@ -319,7 +178,7 @@ if st.session_state.step == "start":
             st.error("Please enter your ID.")
         else:
             with st.spinner("Checking user..."):
-                user = get_user(login_id_clean)
+                user = cached_dashboard_state(login_id_clean)
                 if user:
                     st.session_state.user_id = login_id_clean
                     ensure_ticket_row(st.session_state.user_id)
@@ -337,7 +196,7 @@ if st.session_state.step == "start":
         st.rerun()
 
 
-elif st.session_state.step == "confirm_register":
+def view_confirm_register():
     temp_id = (st.session_state.temp_user_id or "").strip()
     if not temp_id:
         st.warning("ID is empty. Please enter your ID again.")
@@ -351,7 +210,7 @@ elif st.session_state.step == "confirm_register":
             go("start")
 
 
-elif st.session_state.step == "register_form":
+def view_register_form():
     temp_id = (st.session_state.temp_user_id or "").strip()
     if not temp_id:
         st.warning("ID is empty. Please go back and enter your ID.")
@@ -375,14 +234,10 @@ elif st.session_state.step == "register_form":
             go("start")
 
 
-elif st.session_state.step == "dashboard":
-    user = get_user(st.session_state.user_id)
-    if user:
-        name, points = user
-        ensure_ticket_row(st.session_state.user_id)
-        ensure_month_reset(st.session_state.user_id)
-        available, claimed_month, month_key = get_ticket_info(st.session_state.user_id)
-        claimable_now = claimable_tickets_now(st.session_state.user_id)
+def view_dashboard():
+    state = cached_dashboard_state(st.session_state.user_id)
+    if state:
+        name, points, available, claimed_month, month_key, claimable_now = state
 
         st.title(f"Hello, {name}")
         st.write(f"Points: **{points}**")
@@ -405,53 +260,87 @@ elif st.session_state.step == "dashboard":
         if st.button(label, use_container_width=True, disabled=claim_disabled):
             ok = claim_one_ticket(st.session_state.user_id)
             if ok:
-                st.success("1 ticket claimed.")
+                flash("1 ticket claimed.", "🎟️")
             else:
-                st.error("Cannot claim now.")
-            time.sleep(1)
+                flash("Cannot claim now.", "⚠️")
             st.rerun()
 
         if st.button("🚪 Sign out", use_container_width=True):
             st.session_state.user_id = None
             go("start")
 
-elif st.session_state.step == "capture":
-    st.title("Take a photo")
-    st.info("Take one clear photo of the plastic bottle.")
+def has_webrtc() -> bool:
+    """Optional live camera mode: pip install streamlit-webrtc (checked without importing it)."""
+    return importlib.util.find_spec("streamlit_webrtc") is not None
 
-    img_file = st.camera_input("Capture")
-    if img_file is not None:
-        st.session_state.img_bytes = img_file.getvalue()
+def view_capture():
+    from PIL import ImageOps
 
-    if st.session_state.get("img_bytes") and st.button("✅ Validate", use_container_width=True):
-        with open(IMG_PATH_CAPTURE, "wb") as f:
-            f.write(st.session_state.img_bytes)
+    # Your classifier must return: (bool_is_bottle, predictions_list of tuples (id, label, prob))
+    from model.classifier import (
+        is_bottle, is_duplicate_submission, is_plastic_bottle_from_predictions, load_image, model_status,
+    )
+
+    st.title("Take a photo")
+    st.info("Take one clear photo of the plastic bottle.")
 
-        with st.spinner("Analyzing..."):
-            _is_bottle_generic, predictions = is_bottle(IMG_PATH_CAPTURE)
-            is_plastic = is_plastic_bottle_from_predictions(predictions)
+    status = model_status()
+    if status == "loading" or status == "idle":
+        st.caption("⏳ Preparing the bottle detector... you can take the photo meanwhile.")
+    elif status == "error":
+        st.warning("The bottle detector could not be loaded. Please call a teacher.")
+
+    # A frame accepted by the live camera arrives already classified.
+    live_hit = st.session_state.pop("live_hit", None)
+    live_mode = False
+    if live_hit is None:
+        live_mode = has_webrtc() and st.toggle("🎥 Live camera", key="live_mode")
+        if live_mode:
+            live_capture()
+        else:
+            img_file = st.camera_input("Capture")
+            if img_file is not None:
+                st.session_state.img_bytes = img_file.getvalue()
+
+    validate = live_hit is not None or (
+        not live_mode and st.session_state.get("img_bytes") and st.button("✅ Validate", use_container_width=True))
+    if validate:
+        if live_hit is not None:
+            img, predictions = live_hit
+        else:
+            # Decode once in memory; the same frame feeds inference and annotation.
+            img = load_image(st.session_state.img_bytes)
+            with st.spinner("Analyzing..."):
+                _is_bottle_generic, predictions = is_bottle(img)
+        is_plastic = is_plastic_bottle_from_predictions(predictions)
 
-        img = Image.open(IMG_PATH_CAPTURE)
         border = "green" if is_plastic else "red"
         annotated = ImageOps.expand(img, border=12, fill=border)
-        ann_path = unique_filename("capture_annot", "jpg")
-        annotated.save(ann_path, format="JPEG", quality=92)
 
         st.session_state.validated = True
-        st.image(ann_path, caption="Analyzed photo", use_container_width=True)
+        st.image(annotated, caption="Analyzed photo", use_container_width=True)
 
         with st.expander("Details"):
+            import pandas as pd
+
             df = pd.DataFrame(predictions, columns=["ID", "Label", "Prob"])
             df["Prob"] = df["Prob"].apply(lambda x: f"{x*100:.2f}%")
             st.table(df[["Label", "Prob"]])
 
-        if is_plastic:
+        # Same (or nearly the same) photo sent again by this user: no new point.
+        duplicate = (is_plastic and not st.session_state.award_given
+                     and is_duplicate_submission(st.session_state.user_id, img))
+
+        history_id = None
+        inc("validations_total", result="duplicate" if duplicate else "accepted" if is_plastic else "rejected")
+        if duplicate:
+            st.warning("This bottle was already counted. Please recycle a new one.")
+        elif is_plastic:
             if not st.session_state.award_given:
-                add_point(st.session_state.user_id, 1)
-                push_history(st.session_state.user_id, True)
+                history_id = record_capture(st.session_state.user_id, True, 1)
                 st.session_state.award_given = True
 
-            pts = get_points(st.session_state.user_id)
+            pts = cached_dashboard_state(st.session_state.user_id).points
             st.success("Thank you for helping the planet! 🌎")
             st.write(f"You earned **+1 point**. Total: **{pts}**")
 
@@ -460,22 +349,57 @@ elif st.session_state.step == "capture":
             else:
                 st.markdown("🌍♻️ *Keep recycling!*")
 
-            # Back button + auto reset
-            if st.button("Finish / Back to start", use_container_width=True):
-                reset_to_start()
-            st.caption(f"This screen will reset in {AUTO_RESET_SECS} seconds.")
-            time.sleep(AUTO_RESET_SECS)
-            reset_to_start()
+            # Back button + auto reset (timer runs in the browser, see thanks_auto_reset)
+            st.session_state.reset_at = time.time() + AUTO_RESET_SECS
+            thanks_auto_reset()
         else:
-            push_history(st.session_state.user_id, False)
+            history_id = record_capture(st.session_state.user_id, False)
             st.error("This is not a plastic bottle. Please try again.")
             st.caption("Tip: center the bottle and avoid background clutter.")
 
+        # Written (and linked to the history row) by the background archiver
+        get_archiver(on_saved=set_history_image).submit(annotated, history_id)
+
     if st.button("↩️ Cancel / Back", use_container_width=True):
         reset_to_start()
 
+def live_capture():
+    """Live camera: gated frames go to the classifier; the first bottle ends the capture."""
+    from model.classifier import is_bottle, is_plastic_bottle_from_predictions
+    from model.live import LiveDetector
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+
+    detector = st.session_state.get("live_detector")
+    if detector is None:
+        # the stream already offers many views of the bottle; no crop TTA per frame
+        classify = lambda img: is_bottle(img, tta="off")
+        detector = st.session_state.live_detector = LiveDetector(classify, is_plastic_bottle_from_predictions)
+
+    def on_frame(frame):
+        detector.on_frame(frame.to_ndarray(format="rgb24"))
+        return frame
+
+    ctx = webrtc_streamer(
+        key="live_capture",
+        mode=WebRtcMode.SENDRECV,
+        video_frame_callback=on_frame,
+        media_stream_constraints={"video": {"facingMode": "environment"}, "audio": False},
+        sendback_video=False,
+    )
+    if ctx.state.playing:
+        live_poll(detector)
+
+@st.fragment(run_every=0.5)
+def live_poll(detector):
+    hit = detector.take_hit()
+    if hit is not None:
+        st.session_state.live_hit = hit
+        st.rerun()
+    last = detector.stats()["last"]
+    st.caption("Hold the bottle still in front of the camera." + (f" (saw: {last})" if last else ""))
+
 # ---------------- ADMIN VIEWS ----------------
-elif st.session_state.step == "admin_login":
+def view_admin_login():
     st.title("👨‍💼 Admin")
     st.caption("Teachers only")
 
@@ -492,7 +416,7 @@ elif st.session_state.step == "admin_login":
         st.session_state.step = "start"
         st.rerun()
 
-elif st.session_state.step == "admin_panel":
+def view_admin_panel():
     if not st.session_state.get("admin_ok"):
         st.warning("Please sign in as admin.")
         if st.button("Go to admin login", use_container_width=True):
@@ -503,45 +427,194 @@ elif st.session_state.step == "admin_panel":
     st.title("Admin panel")
     st.caption("Find a student and redeem tickets")
 
-    st.session_state.admin_id_query = st.text_input("Student ID", value=st.session_state.admin_id_query)
+    # a radio rather than st.tabs: Streamlit runs the body of every tab on every rerun,
+    # so only the selected section may query the database
+    sections = {"Students": admin_students, "Reports": admin_reports, "Import": admin_import,
+                "Metrics": admin_metrics}
+    section = st.radio("Section", list(sections), horizontal=True, key="admin_section",
+                       label_visibility="collapsed")
+    st.divider()
+    sections[section]()
 
+    if st.button("Sign out (admin)", use_container_width=True):
+        st.session_state.admin_ok = False
+        st.session_state.admin_selected = ""
+        st.session_state.step = "start"
+        st.rerun()
+
+def admin_students():
+    c1, c2 = st.columns([3, 1])
+    prefix = c1.text_input("Search students", placeholder="Name or ID starts with...")
+    by = c2.radio("By", ["name", "id"], horizontal=True, format_func=str.capitalize)
+    if prefix.strip():
+        rows = pager(f"admin_search_{by}_{prefix.strip()}", lambda cur: search_users(prefix, by, cur),
+                     ["ID", "Name", "Points"])
+        if rows:
+            labels = {uid: f"{name} ({uid})" for uid, name, _ in rows}
+            pick = st.selectbox("Student", list(labels), format_func=lambda uid: labels.get(uid, uid))
+            if st.button("Open", use_container_width=True):
+                st.session_state.admin_id_query = pick
+                st.session_state.admin_selected = pick
+                st.rerun()
+
+    st.session_state.admin_id_query = st.text_input("Student ID", value=st.session_state.admin_id_query)
     if st.button("Lookup", use_container_width=True):
-        user = get_user(st.session_state.admin_id_query)
-        if not user:
-            st.error("Student not found.")
+        st.session_state.admin_selected = st.session_state.admin_id_query.strip()
+
+    user_id = st.session_state.admin_selected
+    if not user_id:
+        return
+    state = cached_dashboard_state(user_id)
+    if not state:
+        st.error("Student not found.")
+        return
+    name, points, available, claimed_month, month_key, _ = state
+
+    st.success(f"Student: {name}")
+    st.write(f"Points: **{points}**")
+    st.write(f"Tickets available: **{available}**")
+    st.caption(f"Tickets claimed this month: **{claimed_month}/3**")
+    st.caption(f"Month key: {month_key or '(none)'}")
+
+    qty = st.number_input("Qty to redeem", min_value=1, max_value=max(1, available), value=1, step=1)
+    note = st.text_input("Note (optional)", value=st.session_state.admin_note)
+
+    if st.button("Redeem tickets", use_container_width=True, disabled=(available <= 0)):
+        ok = redeem_tickets(user_id, int(qty), note.strip())
+        if ok:
+            report.clear()
+            flash(f"Redeemed {int(qty)} ticket(s).")
         else:
-            name, points = user
-            ensure_ticket_row(st.session_state.admin_id_query)
-            ensure_month_reset(st.session_state.admin_id_query)
-            available, claimed_month, month_key = get_ticket_info(st.session_state.admin_id_query)
-
-            st.success(f"Student: {name}")
-            st.write(f"Points: **{points}**")
-            st.write(f"Tickets available: **{available}**")
-            st.caption(f"Tickets claimed this month: **{claimed_month}/3**")
-            st.caption(f"Month key: {month_key or '(none)'}")
-
-            qty = st.number_input("Qty to redeem", min_value=1, max_value=max(1, available), value=1, step=1)
-            note = st.text_input("Note (optional)", value=st.session_state.admin_note)
-
-            if st.button("Redeem tickets", use_container_width=True, disabled=(available <= 0)):
-                ok = redeem_tickets(st.session_state.admin_id_query, int(qty), note.strip())
-                if ok:
-                    st.success(f"Redeemed {int(qty)} ticket(s).")
-                else:
-                    st.error("Cannot redeem (not enough tickets).")
-                time.sleep(1)
-                st.rerun()
+            flash("Cannot redeem (not enough tickets).", "⚠️")
+        st.rerun()
 
-            st.subheader("Redemptions log")
-            rows = redemptions_for_user(st.session_state.admin_id_query)
-            if rows:
-                df = pd.DataFrame(rows, columns=["When", "Qty", "Note"])
-                st.table(df)
+    st.subheader("Redemptions log")
+    # first page comes from the view cache; older pages on demand
+    rows = pager(f"admin_redemptions_{user_id}",
+                 lambda cur: cached_redemptions(user_id) if cur is None else redemptions_page(user_id, cur),
+                 ["When", "Qty", "Note"])
+    if not rows:
+        st.info("No redemptions yet.")
+
+def admin_reports():
+    # only the selected report runs, and its pages come from report() while they are fresh
+    choice = st.radio("Report", ["Top recyclers", "Captures", "Tickets outstanding", "Export"], horizontal=True)
+    if choice == "Top recyclers":
+        pager("admin_leaderboard", lambda cur: report("leaderboard", cur), ["ID", "Name", "Points"])
+    elif choice == "Captures":
+        monthly = report("monthly", 12)
+        if monthly:
+            import pandas as pd
+
+            df = pd.DataFrame(monthly, columns=["Month", "Valid", "Invalid"]).set_index("Month").sort_index()
+            st.bar_chart(df)
+        st.caption("Per day (UTC)")
+        pager("admin_daily", lambda cur: report("daily", cur), ["Day", "Valid", "Invalid"])
+    elif choice == "Tickets outstanding":
+        students, tickets = report("outstanding_totals")
+        st.write(f"**{tickets}** ticket(s) not yet redeemed, held by **{students}** student(s).")
+        pager("admin_outstanding", lambda cur: report("outstanding", cur), ["ID", "Name", "Available"])
+    else:
+        kind = st.selectbox("Data", sorted(EXPORTS))
+        if st.button("Prepare CSV", use_container_width=True):
+            # built chunk by chunk from a cursor; for very large exports use `python -m database.reports`
+            st.session_state.admin_export = (kind, b"".join(iter_csv(kind)))
+        export = st.session_state.get("admin_export")
+        if export:
+            st.download_button(f"Download {export[0]}.csv", export[1], file_name=f"{export[0]}.csv",
+                               mime="text/csv", use_container_width=True)
+
+def admin_import():
+    kind = st.radio("Upload", ["users", "points"], horizontal=True,
+                    format_func={"users": "Students (id, name)", "points": "Point adjustments (id, delta, note)"}.get)
+    upload = st.file_uploader("CSV or Excel file", type=["csv", "xlsx"], key=f"admin_upload_{kind}")
+    note = st.text_input("Note for rows without one", key="admin_bulk_note") if kind == "points" else ""
+
+    if upload is not None and st.button("Import", use_container_width=True):
+        bar = st.progress(0.0, text="Importing...")
+
+        def progress(rows_read):
+            bar.progress(min(1.0, upload.tell() / max(1, upload.size)), text=f"{rows_read} rows read")
+
+        rows = iter_rows(upload, upload.name)
+        try:
+            if kind == "users":
+                result = import_users(rows, on_progress=progress)
             else:
-                st.info("No redemptions yet.")
+                result = adjust_points(rows, on_progress=progress, note=note.strip())
+        except Exception as e:  # unreadable file, missing openpyxl, ...: read in full before any write
+            st.error(f"Could not import {upload.name}: {e}")
+            return
+        finally:
+            report.clear()
+        bar.progress(1.0, text=f"{result.rows} rows read")
+        st.session_state.admin_import_result = (upload.name, result.rows, result.written, result.skipped,
+                                                len(result.rejected), rejected_csv(result.rejected),
+                                                result.stopped_at, result.error)
+
+    done = st.session_state.get("admin_import_result")
+    if done:
+        name, rows, written, skipped, n_rejected, rejected_report, stopped_at, error = done
+        if stopped_at:
+            st.error(f"{name}: stopped at line {stopped_at} ({error}). {written} row(s) before it were already "
+                     f"applied; upload only the rows from line {stopped_at} on.")
+        else:
+            st.success(f"{name}: {rows} rows, {written} written, {skipped} unchanged, {n_rejected} rejected.")
+        if n_rejected:
+            st.download_button("Download rejected rows", rejected_report, file_name="rejected_rows.csv", mime="text/csv",
+                               use_container_width=True)
+
+def admin_metrics():
+    import pandas as pd
+
+    rows = [
+        {"Metric": name, "Labels": ", ".join(f"{k}={v}" for k, v in labels.items()), "Count": count,
+         "Mean ms": round(mean * 1000, 2), "~p50 ms": p50 * 1000, "~p95 ms": p95 * 1000}
+        for name, labels, count, mean, p50, p95 in histogram_summary()
+    ]
+    if rows:
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    else:
+        st.info("No timings recorded yet.")
 
-    if st.button("Sign out (admin)", use_container_width=True):
-        st.session_state.admin_ok = False
-        st.session_state.step = "start"
-        st.rerun()
+    with st.expander("Prometheus text"):
+        st.code(render_prometheus(), language="text")
+
+    if st.button("Profile next request", use_container_width=True):
+        request_profile()
+        st.toast("The next page run (any kiosk) will be profiled.")
+    url_allowed = st.toggle("Allow ?profile=1 in the URL", value=url_profiling_allowed())
+    if url_allowed != url_profiling_allowed():
+        allow_url_profiling(url_allowed)
+    for when, label, text in reversed(recent_profiles()):
+        with st.expander(f"Profile {when} ({label or 'run'})"):
+            st.code(text, language="text")
+
+# -------------- ROUTER --------------
+VIEWS = {
+    "start": view_start,
+    "confirm_register": view_confirm_register,
+    "register_form": view_register_form,
+    "dashboard": view_dashboard,
+    "capture": view_capture,
+    "admin_login": view_admin_login,
+    "admin_panel": view_admin_panel,
+}
+
+step = st.session_state.step
+with profile_run(st.query_params.get("profile") == "1", label=step), span("view_seconds", view=step):
+    VIEWS.get(step, view_start)()
+
+# -------------- BACKGROUND WARM-UP --------------
+# Runs after the page has been sent to the browser; the model is shared by the whole process.
+# Even importing the classifier module happens off the script thread.
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    def run():
+        from model.classifier import warm_up
+        warm_up()
+    threading.Thread(target=run, name="classifier-warm-up", daemon=True).start()
+    return True
+
+if st.runtime.exists():  # not for bare `python app.py` runs (monitoring/import_report.py)
+    start_warm_up()
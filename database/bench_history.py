@@ -0,0 +1,102 @@
+"""Benchmark per-user history/redemption lookups before and after the indexes.
+
+Builds a synthetic database at schema version 2 (no indexes), times the
+lookups the app runs, migrates to the latest version and times them again.
+
+Usage (from the repo root):
+    python -m database.bench_history --rows 2000000 --users 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database.migrations import LATEST_VERSION, migrate
+
+QUERIES = {
+    "redemptions_for_user": ("SELECT ts, qty, admin_note FROM redemptions WHERE user_id = ? ORDER BY ts DESC", False),
+    "recent_history":       ("SELECT ts, valid FROM history WHERE user_id = ? ORDER BY ts DESC LIMIT 20", False),
+    "captures_this_month":  ("SELECT COUNT(*), SUM(valid) FROM history WHERE user_id = ? AND ts >= ?", True),
+}
+
+
+def build(db_path: str, rows: int, users: int, seed: int = 7):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn, target=2)
+    ids = [f"s{i:06d}" for i in range(users)]
+    conn.executemany("INSERT INTO users (id, name, points) VALUES (?, ?, 0)", ((u, u) for u in ids))
+    start = datetime(2024, 1, 1)
+    span = 2 * 365 * 86400
+
+    def history_rows():
+        for _ in range(rows):
+            ts = start + timedelta(seconds=rnd.randrange(span))
+            yield rnd.choice(ids), rnd.random() < 0.7, ts.strftime("%Y-%m-%d %H:%M:%S")
+
+    conn.executemany("INSERT INTO history (user_id, valid, ts) VALUES (?, ?, ?)", history_rows())
+    conn.executemany(
+        "INSERT INTO redemptions (user_id, qty, admin_note, ts) VALUES (?, ?, '', ?)",
+        ((rnd.choice(ids), 1, (start + timedelta(seconds=rnd.randrange(span))).strftime("%Y-%m-%d %H:%M:%S"))
+         for _ in range(rows // 20)),
+    )
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def time_queries(db_path: str, ids: list, samples: int) -> dict:
+    conn = sqlite3.connect(db_path)
+    rnd = random.Random(1)
+    month_start = "2025-12-01 00:00:00"
+    out = {}
+    for name, (sql, with_since) in QUERIES.items():
+        timings = []
+        for _ in range(samples):
+            params = (rnd.choice(ids), month_start) if with_since else (rnd.choice(ids),)
+            t0 = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - t0) * 1000.0)
+        timings.sort()
+        out[name] = (statistics.median(timings), timings[int(0.95 * (len(timings) - 1))])
+    conn.close()
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=2_000_000, help="history rows")
+    ap.add_argument("--users", type=int, default=5000)
+    ap.add_argument("--samples", type=int, default=50, help="lookups per query")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        ids = build(db_path, args.rows, args.users)
+        print(f"built {args.rows:,} history rows for {args.users:,} users in {time.perf_counter() - t0:.1f} s")
+
+        before = time_queries(db_path, ids, args.samples)
+        conn = sqlite3.connect(db_path)
+        t0 = time.perf_counter()
+        migrate(conn)
+        conn.close()
+        print(f"migrated to v{LATEST_VERSION} in {time.perf_counter() - t0:.1f} s")
+        after = time_queries(db_path, ids, args.samples)
+
+    print(f"{'query':<22} {'before p50':>11} {'p95':>9} {'after p50':>11} {'p95':>9} {'speedup':>8}")
+    for name in QUERIES:
+        (b50, b95), (a50, a95) = before[name], after[name]
+        print(f"{name:<22} {b50:>9.2f}ms {b95:>7.2f}ms {a50:>9.3f}ms {a95:>7.3f}ms {b50 / max(a50, 1e-6):>7.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Multi-instance load test: throughput vs. number of app instances on one shared store.
+
+Each instance is a separate process (a Streamlit server behind the load
+balancer) with --sessions threads (kiosks it serves). One request is the
+capture flow of the app: dashboard read, inference (simulated with a sleep of
+--infer-ms, so the test measures the shared store rather than this machine's
+CPU count), record_capture, an image put into the blob store,
+set_history_image, and a ticket claim when one is available. Every instance
+count runs for --seconds; aggregate requests/s and scaling efficiency
+(rps / (instances x rps of one instance)) are printed.
+
+Users are seeded under a fresh prefix per run, so an existing database is
+never modified.
+
+Usage (from the repo root):
+    python -m database.bench_instances                                  # SQLite temp file, local blobs
+    python -m database.bench_instances --db-url postgresql://localhost/recycle --blob-store db
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from database import repository as repo
+
+
+def seed(db_url: str, prefix: str, users: int):
+    repo.set_db_path(db_url)
+    repo.init_db()
+    ids = [f"{prefix}{i:05d}" for i in range(users)]
+    with repo.transaction(immediate=True) as conn:
+        conn.executemany("INSERT INTO users (id, name, points) VALUES (?, ?, ?)", ((u, u, 10) for u in ids))
+        conn.executemany(
+            "INSERT INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, 0, 0, '')",
+            ((u,) for u in ids),
+        )
+        repo.open_balances(conn, ((u, 10, 0) for u in ids))
+    repo.close_all()
+    return ids
+
+
+def _session(ids, store, infer_secs: float, image_bytes: int, deadline: float, seed_value: int, out: list):
+    rnd = random.Random(seed_value)
+    while time.monotonic() < deadline:
+        user_id = rnd.choice(ids)
+        t0 = time.perf_counter()
+        try:
+            state = repo.get_dashboard_state(user_id)
+            time.sleep(infer_secs)
+            valid = rnd.random() < 0.8
+            history_id = repo.record_capture(user_id, valid)
+            repo.set_history_image(history_id, store.put(os.urandom(image_bytes), "jpg"))
+            if state.claimable:
+                repo.claim_one_ticket(user_id)
+        except Exception:
+            out.append(None)
+            continue
+        out.append(time.perf_counter() - t0)
+
+
+def run_instance(db_url: str, blob_store: str, blob_root: str, ids, sessions: int, infer_secs: float,
+                 image_bytes: int, start_at: float, seconds: float, seed_value: int, out_queue):
+    from storage.blobs import DbBlobStore, LocalBlobStore
+
+    repo.set_db_path(db_url)
+    repo.init_db()
+    store = DbBlobStore() if blob_store == "db" else LocalBlobStore(blob_root)
+    results = []
+    time.sleep(max(0.0, start_at - time.time()))  # all instances start together
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(target=_session,
+                         args=(ids, store, infer_secs, image_bytes, deadline, seed_value * 1000 + i, results))
+        for i in range(sessions)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    repo.close_all()
+    out_queue.put(results)
+
+
+def run(args, db_url: str, blob_root: str, instances: int, ids) -> dict:
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    start_at = time.time() + 2.0  # spawn + imports
+    procs = [
+        ctx.Process(target=run_instance, args=(db_url, args.blob_store, blob_root, ids, args.sessions,
+                                               args.infer_ms / 1000, args.image_kb * 1024, start_at,
+                                               args.seconds, i, out))
+        for i in range(instances)
+    ]
+    for p in procs:
+        p.start()
+    results = [r for _ in procs for r in out.get()]
+    for p in procs:
+        p.join()
+    latencies = sorted(r * 1000 for r in results if r is not None)
+    return {
+        "rps": len(latencies) / args.seconds,
+        "errors": len(results) - len(latencies),
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db-url", default="", help="database file or postgresql:// URL (default: a temporary file)")
+    ap.add_argument("--blob-store", choices=["local", "db"], default="local")
+    ap.add_argument("--instances", default="1,2,4,8", help="comma-separated instance counts")
+    ap.add_argument("--sessions", type=int, default=4, help="concurrent kiosks per instance")
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--seconds", type=float, default=10.0, help="duration of each run")
+    ap.add_argument("--infer-ms", type=float, default=150.0, help="simulated inference latency")
+    ap.add_argument("--image-kb", type=int, default=40, help="size of each stored image")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = args.db_url or os.path.join(tmp, "bench.db")
+        blob_root = os.path.join(tmp, "blobs")
+        ids = seed(db_url, f"b{int(time.time()) % 100000}_", args.users)
+        print(f"store: {'postgres' if db_url.startswith('postgres') else 'sqlite'} + {args.blob_store} blobs, "
+              f"{args.sessions} sessions/instance, {args.infer_ms:.0f} ms inference")
+        print(f"{'instances':>9} {'req/s':>8} {'p50':>9} {'p95':>9} {'errors':>7} {'efficiency':>11}")
+        base = None
+        for n in (int(x) for x in args.instances.split(",")):
+            r = run(args, db_url, blob_root, n, ids)
+            base = base or r["rps"] / n
+            print(f"{n:>9} {r['rps']:>8.1f} {r['p50']:>7.1f}ms {r['p95']:>7.1f}ms {r['errors']:>7} "
+                  f"{r['rps'] / (n * base):>10.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Balance-read latency on a large points ledger: snapshot + tail vs. a full fold.
+
+Builds a ledger of --events events spread over --users users (the mix of a
+running school: mostly capture_valid, some ticket claims, redemptions and
+admin adjustments), with per-user snapshots taken so that the last
+--tail-events events per user (on average) are still unfolded, as between two
+snapshots in production. Then times, on random users:
+
+    snapshot+tail  repository.get_balance() - the read every view uses now
+    full fold      SUM over all of the user's events (idx_ledger_user_id)
+    counter        the users.points projection, for reference
+
+and finally the batched rebuild of every snapshot (database/ledger.py).
+
+Usage (from the repo root):
+    python -m database.bench_ledger                        # 10M events, 100k users
+    python -m database.bench_ledger --events 1000000 --db ledger.db
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from database import repository
+from database.ledger import rebuild
+from database.migrations import migrate
+
+# (kind, points, tickets, weight)
+EVENT_MIX = [("capture_valid", 1, 0, 85), ("ticket_claim", -15, 1, 8), ("redemption", 0, -1, 5),
+             ("admin_adjust", 5, 0, 2)]
+CHUNK = 200_000
+
+
+def _events(rnd: random.Random, ids, n: int, now: int):
+    weights = [m[3] for m in EVENT_MIX]
+    for _ in range(n):
+        kind, points, tickets = rnd.choices(EVENT_MIX, weights)[0][:3]
+        yield rnd.choice(ids), repository.LEDGER_KINDS[kind], points, tickets, None, now
+
+
+def build(db_path: str, users: int, events: int, tail_events: int, seed: int = 7):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn)
+    ids = [f"s{i:06d}" for i in range(users)]
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO users (id, name) VALUES (?, ?)", ((u, u) for u in ids))
+    conn.executemany("INSERT INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, 0, 0, '')",
+                     ((u,) for u in ids))
+    conn.execute("COMMIT")
+    # everything but the tails is folded into snapshots, as SNAPSHOT_EVERY would have done
+    folded = max(0, events - users * tail_events)
+    now = int(time.time())
+    _insert(conn, _events(rnd, ids, folded, now), 0, events)
+    conn.execute("""
+        INSERT INTO ledger_snapshots (user_id, last_id, points, tickets)
+        SELECT user_id, MAX(id), SUM(points), SUM(tickets) FROM ledger GROUP BY user_id
+    """)
+    _insert(conn, _events(rnd, ids, events - folded, now), folded, events)
+    print(file=sys.stderr)
+    # the counters are the ledger's projection, as the repository keeps them
+    conn.execute("BEGIN")
+    conn.execute("UPDATE users SET points = (SELECT COALESCE(SUM(points), 0) FROM ledger WHERE user_id = users.id)")
+    conn.execute("UPDATE tickets SET available = "
+                 "(SELECT COALESCE(SUM(tickets), 0) FROM ledger WHERE user_id = tickets.user_id)")
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+    return ids
+
+
+def _insert(conn, rows, done: int, total: int):
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK))
+        if not chunk:
+            return
+        conn.execute("BEGIN")
+        conn.executemany(repository.SQL_LEDGER_APPEND, chunk)
+        conn.execute("COMMIT")
+        done += len(chunk)
+        print(f"  {done:,} / {total:,} events", file=sys.stderr, end="\r")
+
+
+def full_fold(user_id: str) -> tuple:
+    with repository.connection() as conn:
+        return conn.execute("SELECT COALESCE(SUM(points), 0), COALESCE(SUM(tickets), 0) FROM ledger "
+                            "WHERE user_id = ?", (user_id,)).fetchone()
+
+
+def counter(user_id: str) -> int:
+    with repository.connection() as conn:
+        return conn.execute(repository.SQL_POINTS, (user_id,)).fetchone()[0]
+
+
+def time_reads(fn, ids, samples: int, seed: int = 1):
+    rnd = random.Random(seed)
+    timings = []
+    for user_id in rnd.sample(ids, samples):
+        t0 = time.perf_counter()
+        fn(user_id)
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))], timings[int(0.99 * (len(timings) - 1))]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", type=int, default=10_000_000)
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--tail-events", type=int, default=repository.SNAPSHOT_EVERY // 2,
+                    help="average unfolded events per user")
+    ap.add_argument("--samples", type=int, default=5000, help="reads per variant")
+    ap.add_argument("--db", default="", help="keep the built database here (reused if it exists)")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "ledger.db")
+        if os.path.exists(db_path):
+            ids = [f"s{i:06d}" for i in range(args.users)]
+        else:
+            t0 = time.perf_counter()
+            ids = build(db_path, args.users, args.events, args.tail_events)
+            print(f"built {args.events:,} events for {args.users:,} users in {time.perf_counter() - t0:.0f} s")
+        repository.set_db_path(db_path)
+        repository.init_db()
+        samples = min(args.samples, len(ids))
+        assert all(tuple(repository.get_balance(u)) == full_fold(u) for u in ids[:100])  # same answer
+
+        results = [(name, time_reads(fn, ids, samples))
+                   for name, fn in (("snapshot+tail", repository.get_balance), ("full fold", full_fold),
+                                    ("counter", counter))]
+        print(f"{'balance read':<14} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name, (p50, p95, p99) in results:
+            print(f"{name:<14} {p50:>7.3f}ms {p95:>7.3f}ms {p99:>7.3f}ms")
+        fold50, snap50 = results[1][1][0], results[0][1][0]
+        print(f"snapshot+tail is {fold50 / max(snap50, 1e-6):.1f}x faster than a full fold at p50")
+
+        t0 = time.perf_counter()
+        result = rebuild()
+        print(f"batched rebuild: {result.snapshots:,} snapshots, {len(result.mismatched):,} counters fixed "
+              f"in {time.perf_counter() - t0:.1f} s")
+        repository.close_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
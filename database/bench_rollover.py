@@ -0,0 +1,106 @@
+"""Benchmark the dashboard read path before and after the set-based month rollover.
+
+"before" replays the old per-read sequence: the per-user month reset (ticket
+row insert, read, and a write when the month changed), then get_points() and
+get_ticket_info() again. "after" is the pure get_dashboard_state() read. Both
+start on a database where every ticket row still carries last month's key.
+The one-off rollover_month() over all users is timed separately.
+
+Usage (from the repo root):
+    python -m database.bench_rollover --users 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from database import repository
+from database.migrations import migrate
+
+LAST_MONTH = "2000-01"
+
+
+def build(db_path: str, users: int, seed: int = 3):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn)
+    ids = [f"s{i:06d}" for i in range(users)]
+    balances = [(u, rnd.randrange(100), rnd.randrange(3)) for u in ids]
+    conn.executemany("INSERT INTO users (id, name, points) VALUES (?, ?, ?)", ((u, u, p) for u, p, _ in balances))
+    conn.executemany("INSERT INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, ?, ?, ?)",
+                     ((u, t, rnd.randrange(4), LAST_MONTH) for u, _, t in balances))
+    repository.open_balances(conn, balances)
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def legacy_read(user_id: str) -> int:
+    """The pre-rollover claimable_tickets_now(): 5-6 statements, one of them a write."""
+    with repository.connection() as conn:
+        conn.execute(repository.SQL_INSERT_TICKETS, (user_id,))
+        available, claimed_month, month_key = conn.execute(repository.SQL_TICKETS, (user_id,)).fetchone()
+        current_key = repository.month_key_now()
+        if month_key != current_key:
+            conn.execute(repository.SQL_SET_TICKETS, (available, 0, current_key, user_id))
+        points = conn.execute(repository.SQL_POINTS, (user_id,)).fetchone()[0]
+        conn.execute(repository.SQL_INSERT_TICKETS, (user_id,))
+        _, claimed_month, _ = conn.execute(repository.SQL_TICKETS, (user_id,)).fetchone()
+    return repository._claimable(points, claimed_month)
+
+
+def pure_read(user_id: str) -> int:
+    return repository.get_dashboard_state(user_id).claimable
+
+
+def time_reads(fn, ids, samples: int, seed: int = 1):
+    rnd = random.Random(seed)
+    timings = []
+    for user_id in rnd.sample(ids, samples):
+        t0 = time.perf_counter()
+        fn(user_id)
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--samples", type=int, default=2000, help="reads per variant")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for variant, fn in (("before", legacy_read), ("after", pure_read)):
+            db_path = os.path.join(tmp, f"{variant}.db")
+            t0 = time.perf_counter()
+            ids = build(db_path, args.users)
+            print(f"[{variant}] built {args.users:,} users in {time.perf_counter() - t0:.1f} s")
+            repository.set_db_path(db_path)
+            repository.init_db()
+            if variant == "after":
+                t0 = time.perf_counter()
+                reset = repository.rollover_month()
+                print(f"[after] rollover_month() reset {reset:,} rows in {(time.perf_counter() - t0) * 1000:.0f} ms")
+                t0 = time.perf_counter()
+                repository.rollover_month()
+                print(f"[after] repeat rollover_month() (nothing due) in {(time.perf_counter() - t0) * 1000:.2f} ms")
+            results[variant] = time_reads(fn, ids, min(args.samples, len(ids)))
+            repository.close_all()
+
+    (b50, b95), (a50, a95) = results["before"], results["after"]
+    print(f"{'read path':<10} {'p50':>9} {'p95':>9}")
+    print(f"{'before':<10} {b50:>7.3f}ms {b95:>7.3f}ms")
+    print(f"{'after':<10} {a50:>7.3f}ms {a95:>7.3f}ms   ({b50 / max(a50, 1e-6):.1f}x faster at p50)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
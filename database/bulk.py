@@ -0,0 +1,259 @@
+"""Bulk student import and bulk point adjustments from CSV or Excel.
+
+Files are read row by row (csv module / openpyxl read-only mode) and the whole
+file is decoded and validated before the first write, so an unreadable file
+changes nothing. Valid rows are then written with executemany in chunks of
+CHUNK_ROWS, one IMMEDIATE transaction per chunk; if a chunk fails, the chunks
+before it stay committed and the result says how many rows were written and
+at which line it stopped. Rows that fail validation are collected with their
+line number and reason so the caller can offer them back as a CSV report.
+
+Columns (header names are case-insensitive):
+    users:  id, name
+    points: id, delta[, note]
+
+Usage (from the repo root):
+    python -m database.bulk users students.xlsx --rejected rejected.csv
+    python -m database.bulk points corrections.csv
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from typing import Iterator, List, NamedTuple, Tuple
+
+from database.names import name_key
+from database.repository import append_events, init_db, invalidate_user, retry_on_busy, set_db_path, transaction
+from monitoring.metrics import timed
+
+CHUNK_ROWS = int(os.getenv("RECYCLE_BULK_CHUNK", "1000"))
+MAX_ID_LEN = 64
+MAX_NAME_LEN = 120
+
+
+class BulkResult(NamedTuple):
+    rows: int          # data rows read
+    written: int       # users created / adjustments applied
+    skipped: int       # valid rows that changed nothing (user already exists)
+    rejected: List[Tuple[int, dict, str]]  # (line, row, reason)
+    stopped_at: int = 0  # line of the first row not written after a write error; 0 when the file finished
+    error: str = ""
+
+
+# ---------------- READING ----------------
+def iter_rows(fileobj, filename: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (line number, {lower-case header: str value}) from a .csv or .xlsx file object."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook  # optional: pip install openpyxl
+
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [str(h or "").strip().lower() for h in next(rows, ())]
+            for line, values in enumerate(rows, start=2):
+                if any(v is not None and str(v).strip() for v in values):
+                    yield line, {h: "" if v is None else _cell(v) for h, v in zip(header, values)}
+        finally:
+            wb.close()
+        return
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        reader.fieldnames = [(h or "").strip().lower() for h in reader.fieldnames or []]
+        for row in reader:
+            if any((v or "").strip() for v in row.values() if isinstance(v, str)):
+                yield reader.line_num, {k: (v or "").strip() for k, v in row.items() if isinstance(k, str)}
+    finally:
+        text.detach()  # leave the caller's file object open
+
+
+def _cell(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel stores 1001 as 1001.0
+    return str(value).strip()
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------------- USERS ----------------
+def _validate_user(row: dict, seen: set):
+    user_id, name = row.get("id", ""), row.get("name", "")
+    if not user_id:
+        return "missing id"
+    if len(user_id) > MAX_ID_LEN:
+        return "id too long"
+    if not user_id.isprintable():  # inner spaces are fine, as at the kiosk's sign-in
+        return "invalid id"
+    if not name:
+        return "missing name"
+    if len(name) > MAX_NAME_LEN:
+        return "name too long"
+    if user_id in seen:
+        return "duplicate id in file"
+    return None
+
+
+@retry_on_busy
+def _write_users(chunk) -> int:
+    with transaction(immediate=True) as conn:
+        created = conn.executemany(
+            "INSERT INTO users (id, name, name_key) VALUES (?, ?, ?) ON CONFLICT(id) DO NOTHING",
+            ((user_id, name, name_key(name)) for _, user_id, name in chunk),
+        ).rowcount
+        conn.executemany(
+            "INSERT OR IGNORE INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, 0, 0, '')",
+            ((user_id,) for _, user_id, _ in chunk),
+        )
+    return created
+
+
+@timed("db_call_seconds")
+def import_users(rows, chunk_rows: int = CHUNK_ROWS, on_progress=None) -> BulkResult:
+    """Create users (and their tickets rows) from (line, row) pairs; existing IDs are left alone."""
+    seen, rejected, valid = set(), [], []
+    total = 0
+    for line, row in rows:
+        total += 1
+        reason = _validate_user(row, seen)
+        if reason:
+            rejected.append((line, row, reason))
+        else:
+            seen.add(row["id"])
+            valid.append((line, row["id"], row["name"]))
+        if on_progress and total % chunk_rows == 0:
+            on_progress(total)
+
+    written = attempted = stopped_at = 0
+    error = ""
+    try:
+        for chunk in _chunks(valid, chunk_rows):
+            try:
+                written += _write_users(chunk)
+            except Exception as e:  # the earlier chunks are committed; report where to resume
+                stopped_at, error = chunk[0][0], f"{type(e).__name__}: {e}"
+                break
+            attempted += len(chunk)
+    finally:
+        if written:
+            invalidate_user()
+    return BulkResult(total, written, attempted - written, rejected, stopped_at, error)
+
+
+# ---------------- POINTS ----------------
+@retry_on_busy
+def _apply_adjustments(chunk, note: str = "") -> List[Tuple[int, dict, str]]:
+    """Apply one chunk atomically as admin_adjust ledger events; returns the rows rejected against the current balances."""
+    ids = sorted({row["id"] for _, row, _ in chunk})
+    rejected, apply = [], []
+    with transaction(immediate=True) as conn:
+        placeholders = ",".join("?" * len(ids))
+        # users.points is the ledger's projection, updated in the same transactions as the ledger
+        balance = dict(conn.execute(f"SELECT id, points FROM users WHERE id IN ({placeholders})", ids))
+        for line, row, delta in chunk:
+            if row["id"] not in balance:
+                rejected.append((line, row, "unknown id"))
+            elif balance[row["id"]] + delta < 0:
+                rejected.append((line, row, f"would leave {balance[row['id']] + delta} points"))
+            else:
+                balance[row["id"]] += delta
+                apply.append((row["id"], delta, row.get("note") or note))
+        append_events(conn, "admin_adjust", ((u, d, 0) for u, d, _ in apply))
+        conn.executemany("INSERT INTO point_adjustments (user_id, delta, note) VALUES (?, ?, ?)", apply)
+    return rejected
+
+
+@timed("db_call_seconds")
+def adjust_points(rows, chunk_rows: int = CHUNK_ROWS, on_progress=None, note: str = "") -> BulkResult:
+    """Add `delta` (may be negative) to each row's user; balances never go below zero."""
+    rejected, valid = [], []
+    total = 0
+    for line, row in rows:
+        total += 1
+        try:
+            delta = int(row.get("delta", ""))
+        except ValueError:
+            rejected.append((line, row, "delta is not an integer"))
+        else:
+            if not row.get("id"):
+                rejected.append((line, row, "missing id"))
+            elif delta == 0:
+                rejected.append((line, row, "delta is zero"))
+            else:
+                valid.append((line, row, delta))
+        if on_progress and total % chunk_rows == 0:
+            on_progress(total)
+
+    applied = stopped_at = 0
+    error = ""
+    try:
+        for chunk in _chunks(valid, chunk_rows):
+            try:
+                failed = _apply_adjustments(chunk, note)
+            except Exception as e:  # the earlier chunks are committed; re-running the file would apply them twice
+                stopped_at, error = chunk[0][0], f"{type(e).__name__}: {e}"
+                break
+            rejected.extend(failed)
+            applied += len(chunk) - len(failed)
+    finally:
+        if applied:
+            invalidate_user()
+    rejected.sort(key=lambda r: r[0])
+    return BulkResult(total, applied, 0, rejected, stopped_at, error)
+
+
+# ---------------- REPORT ----------------
+def rejected_csv(rejected) -> bytes:
+    """The rejected rows as CSV: line, reason, then the original columns."""
+    columns = []
+    for _, row, _ in rejected:
+        columns.extend(k for k in row if k not in columns)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["line", "reason"] + columns)
+    for line, row, reason in rejected:
+        writer.writerow([line, reason] + [row.get(c, "") for c in columns])
+    return buf.getvalue().encode("utf-8")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("kind", choices=["users", "points"])
+    ap.add_argument("file", help=".csv or .xlsx")
+    ap.add_argument("--note", default="", help="note for adjustments without one (points)")
+    ap.add_argument("--rejected", default="", help="write rejected rows to this CSV")
+    ap.add_argument("--db", default="", help="database file (default: RECYCLE_DB_PATH)")
+    args = ap.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+    init_db()
+
+    with open(args.file, "rb") as f:
+        rows = iter_rows(f, args.file)
+        progress = lambda n: print(f"  {n} rows", file=sys.stderr)
+        if args.kind == "users":
+            result = import_users(rows, on_progress=progress)
+        else:
+            result = adjust_points(rows, on_progress=progress, note=args.note)
+    print(f"{result.rows} rows: {result.written} written, {result.skipped} unchanged, "
+          f"{len(result.rejected)} rejected")
+    if result.stopped_at:
+        print(f"stopped at line {result.stopped_at} ({result.error}); the rows before it were written")
+    if args.rejected and result.rejected:
+        with open(args.rejected, "wb") as f:
+            f.write(rejected_csv(result.rejected))
+        print(f"rejected rows written to {args.rejected}")
+    return 1 if result.stopped_at else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
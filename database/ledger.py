@@ -0,0 +1,103 @@
+"""Rebuild ledger snapshots and the points/tickets counters from the event log.
+
+The ledger (migration v9) is the source of truth for points and available
+tickets; ledger_snapshots and the users.points / tickets.available counters
+are derived from it. rebuild() walks the users in id order, BATCH_USERS at a
+time, folds each batch's events into fresh snapshots with one GROUP BY and
+rewrites any counter that disagrees, one IMMEDIATE transaction per batch, so
+kiosks keep writing between batches. --check only reports the mismatches.
+
+Usage (from the repo root):
+    python -m database.ledger --check
+    python -m database.ledger --batch 2000
+"""
+import argparse
+import os
+import sys
+from typing import List, NamedTuple, Tuple
+
+from database.repository import (
+    SQL_LEDGER_SNAPSHOT, init_db, invalidate_user, retry_on_busy, set_db_path, transaction,
+)
+from monitoring.metrics import timed
+
+BATCH_USERS = int(os.getenv("RECYCLE_LEDGER_BATCH", "1000"))
+
+
+class RebuildResult(NamedTuple):
+    users: int
+    snapshots: int
+    mismatched: List[Tuple[str, int, int, int, int]]  # (user_id, points, ledger points, available, ledger tickets)
+
+
+@retry_on_busy
+def _rebuild_batch(after: str, batch_users: int, write: bool):
+    """One batch of users after `after`; returns (last user id or None, users, snapshots, mismatches)."""
+    with transaction(immediate=write) as conn:
+        rows = conn.execute("""
+            SELECT u.id, u.points, COALESCE(t.available, 0) FROM users u
+            LEFT JOIN tickets t ON t.user_id = u.id
+            WHERE u.id > ? ORDER BY u.id LIMIT ?
+        """, (after, batch_users)).fetchall()
+        if not rows:
+            return None, 0, 0, []
+        ids = [r[0] for r in rows]
+        placeholders = ",".join("?" * len(ids))
+        sums = {
+            user_id: (last_id, points, tickets)
+            for user_id, last_id, points, tickets in conn.execute(f"""
+                SELECT user_id, MAX(id), SUM(points), SUM(tickets) FROM ledger
+                WHERE user_id IN ({placeholders}) GROUP BY user_id
+            """, ids)
+        }
+        mismatched = []
+        for user_id, points, available in rows:
+            _, ledger_points, ledger_tickets = sums.get(user_id, (None, 0, 0))
+            if (points, available) != (ledger_points, ledger_tickets):
+                mismatched.append((user_id, points, ledger_points, available, ledger_tickets))
+        if write:
+            conn.executemany(SQL_LEDGER_SNAPSHOT, ((u, *s) for u, s in sums.items()))
+            conn.executemany("UPDATE users SET points = ? WHERE id = ?", ((m[2], m[0]) for m in mismatched))
+            conn.executemany("UPDATE tickets SET available = ? WHERE user_id = ?", ((m[4], m[0]) for m in mismatched))
+    return ids[-1], len(ids), len(sums), mismatched
+
+
+@timed("db_call_seconds")
+def rebuild(batch_users: int = BATCH_USERS, write: bool = True, on_progress=None) -> RebuildResult:
+    """Recompute every snapshot and counter from the ledger; write=False only audits."""
+    after, users, snapshots, mismatched = "", 0, 0, []
+    while True:
+        last, n, s, m = _rebuild_batch(after, batch_users, write)
+        if last is None:
+            break
+        after, users, snapshots = last, users + n, snapshots + s
+        mismatched.extend(m)
+        if on_progress:
+            on_progress(users)
+    if write and mismatched:
+        invalidate_user()
+    return RebuildResult(users, snapshots, mismatched)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--check", action="store_true", help="report counter mismatches, write nothing")
+    ap.add_argument("--batch", type=int, default=BATCH_USERS, help="users per transaction")
+    ap.add_argument("--db", default="", help="database file or postgresql:// URL (default: RECYCLE_DB_PATH)")
+    args = ap.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+    init_db()
+
+    result = rebuild(args.batch, write=not args.check, on_progress=lambda n: print(f"  {n} users", file=sys.stderr))
+    for user_id, points, ledger_points, available, ledger_tickets in result.mismatched[:20]:
+        print(f"{user_id}: points {points} (ledger {ledger_points}), tickets {available} (ledger {ledger_tickets})")
+    if args.check:
+        print(f"{result.users} users checked, {len(result.mismatched)} counter mismatches")
+    else:
+        print(f"{result.users} users, {result.snapshots} snapshots written, {len(result.mismatched)} counters fixed")
+    return 1 if args.check and result.mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
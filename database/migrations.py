@@ -0,0 +1,415 @@
+"""Versioned schema migrations for recycle.db, tracked with PRAGMA user_version.
+
+Each step runs in its own BEGIN IMMEDIATE transaction and re-checks the version
+under the write lock, so several app processes can start at once safely.
+Add new steps at the end of MIGRATIONS; never edit a released one.
+"""
+import sqlite3
+import threading
+import warnings
+
+from database.names import fill_name_keys
+
+
+def _columns(conn, table: str) -> dict:
+    """name -> (type, notnull, pk) for an existing table ({} if missing)."""
+    return {row[1]: (row[2], row[3], row[5]) for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+# ---------------- STEPS ----------------
+def _v1_base_schema(conn):
+    # Users & points
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            points INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # Claimable tickets & monthly control
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tickets (
+            user_id TEXT PRIMARY KEY,
+            available INTEGER NOT NULL DEFAULT 0,         -- unredeemed balance
+            claimed_month INTEGER NOT NULL DEFAULT 0,     -- claimed this month
+            month_key TEXT NOT NULL DEFAULT '',           -- 'YYYY-MM'
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    # Redemption log (teacher uses)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS redemptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            admin_note TEXT,
+            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    # Capture history
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            valid INTEGER NOT NULL,
+            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+
+def _v2_reconcile_legacy(conn):
+    """Rebuild tables created by the old database/setup_db.py into the app schema."""
+    users = _columns(conn, "users")
+    if users and not users["name"][1]:
+        conn.execute("""
+            CREATE TABLE users_new (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                points INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("INSERT INTO users_new (id, name, points) SELECT id, COALESCE(name, ''), COALESCE(points, 0) FROM users")
+        conn.execute("DROP TABLE users")
+        conn.execute("ALTER TABLE users_new RENAME TO users")
+
+    history = _columns(conn, "history")
+    if history and "ts" not in history:
+        conn.execute("""
+            CREATE TABLE history_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                valid INTEGER NOT NULL,
+                ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+        """)
+        conn.execute("""
+            INSERT INTO history_new (user_id, valid, ts)
+            SELECT user_id, CASE WHEN valid IN (1, '1', 'true', 'True') THEN 1 ELSE 0 END,
+                   COALESCE(timestamp, CURRENT_TIMESTAMP)
+            FROM history WHERE user_id IS NOT NULL
+            ORDER BY timestamp
+        """)
+        conn.execute("DROP TABLE history")
+        conn.execute("ALTER TABLE history_new RENAME TO history")
+
+
+def _v3_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_user_ts ON history (user_id, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_ts ON history (ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_redemptions_user_ts ON redemptions (user_id, ts)")
+
+
+def _v4_history_image(conn):
+    # archived annotated capture, relative to the archive root (storage/archive.py)
+    if "image_path" not in _columns(conn, "history"):
+        conn.execute("ALTER TABLE history ADD COLUMN image_path TEXT")
+
+
+def _v5_reporting(conn):
+    """Daily capture counters kept by triggers, plus indexes for the admin reports."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS history_daily (
+            day TEXT PRIMARY KEY,                        -- 'YYYY-MM-DD' (UTC, like history.ts)
+            valid INTEGER NOT NULL DEFAULT 0,
+            invalid INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM history_daily")
+    conn.execute("""
+        INSERT INTO history_daily (day, valid, invalid)
+        SELECT substr(ts, 1, 10), SUM(valid <> 0), SUM(valid = 0) FROM history GROUP BY 1
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_history_daily_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_daily (day, valid, invalid)
+            VALUES (substr(NEW.ts, 1, 10), NEW.valid <> 0, NEW.valid = 0)
+            ON CONFLICT(day) DO UPDATE SET valid = valid + excluded.valid, invalid = invalid + excluded.invalid;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_history_daily_delete AFTER DELETE ON history BEGIN
+            UPDATE history_daily SET valid = valid - (OLD.valid <> 0), invalid = invalid - (OLD.valid = 0)
+            WHERE day = substr(OLD.ts, 1, 10);
+        END
+    """)
+    # leaderboard keyset (points DESC, id), name prefix search, outstanding tickets
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_points ON users (points DESC, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_name ON users (lower(name), id)")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tickets_outstanding ON tickets (available DESC, user_id)
+        WHERE available > 0
+    """)
+
+
+def _v6_point_adjustments(conn):
+    # audit log of admin point corrections (bulk uploads)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS point_adjustments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            note TEXT,
+            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_point_adjustments_user_ts ON point_adjustments (user_id, ts)")
+
+
+def _v7_month_key_index(conn):
+    # lets the monthly rollover (UPDATE ... WHERE month_key <> ?) skip rows already current
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_month_key ON tickets (month_key)")
+
+
+def _v8_blobs(conn):
+    # content-addressed image store for multi-host deployments (IMG_STORE=db, storage/blobs.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            key TEXT PRIMARY KEY,                        -- sha256-derived, see storage/blobs.py
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            ts REAL NOT NULL                             -- unix time of the last put (retention)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_ts ON blobs (ts)")
+
+
+# Opening balance per user, so the ledger starts out agreeing with the counters.
+_LEDGER_OPENING = """
+    INSERT INTO ledger (user_id, kind, points, tickets, ts)
+    SELECT u.id, 0, u.points, COALESCE(t.available, 0), {now}
+    FROM users u LEFT JOIN tickets t ON t.user_id = u.id
+    WHERE u.points <> 0 OR COALESCE(t.available, 0) <> 0
+    ORDER BY u.id
+"""
+_LEDGER_SNAPSHOT_ALL = """
+    INSERT INTO ledger_snapshots (user_id, last_id, points, tickets)
+    SELECT user_id, MAX(id), SUM(points), SUM(tickets) FROM ledger GROUP BY user_id
+"""
+
+
+def _v9_ledger(conn):
+    # append-only points/tickets ledger; users.points and tickets.available become
+    # projections of it, kept in the same transaction (see LEDGER in repository.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ledger (
+            id INTEGER PRIMARY KEY,                      -- append order
+            user_id TEXT NOT NULL,
+            kind INTEGER NOT NULL,                       -- LEDGER_KINDS in repository.py
+            points INTEGER NOT NULL DEFAULT 0,           -- delta
+            tickets INTEGER NOT NULL DEFAULT 0,          -- delta of available tickets
+            ref INTEGER,                                 -- history / redemptions id
+            ts INTEGER NOT NULL                          -- unix time
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_user_id ON ledger (user_id, id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_snapshots (
+            user_id TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,                    -- events up to here are folded in
+            points INTEGER NOT NULL,
+            tickets INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute(_LEDGER_OPENING.format(now="CAST(strftime('%s', 'now') AS INTEGER)"))
+    conn.execute(_LEDGER_SNAPSHOT_ALL)
+
+
+def _v10_name_key(conn):
+    # case/accent-insensitive name search (database/names.py); lower() folds ASCII only
+    if "name_key" not in _columns(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN name_key TEXT NOT NULL DEFAULT ''")
+    fill_name_keys(conn)
+    conn.execute("DROP INDEX IF EXISTS idx_users_name")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_name_key ON users (name_key, id)")
+
+
+MIGRATIONS = [
+    (1, _v1_base_schema),
+    (2, _v2_reconcile_legacy),
+    (3, _v3_indexes),
+    (4, _v4_history_image),
+    (5, _v5_reporting),
+    (6, _v6_point_adjustments),
+    (7, _v7_month_key_index),
+    (8, _v8_blobs),
+    (9, _v9_ledger),
+    (10, _v10_name_key),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------------- POSTGRES ----------------
+# The same schema for RECYCLE_DB_URL=postgresql://... (database/pg.py). Postgres
+# support started at version 8, so PG_SCHEMA is that version in one step; later
+# steps get a (version, sqlite_step) entry above and a matching
+# (version, statements) entry here; a statement may also be a callable(conn).
+# The version lives in table schema_version.
+PG_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        points INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS tickets (
+        user_id TEXT PRIMARY KEY REFERENCES users(id),
+        available INTEGER NOT NULL DEFAULT 0,
+        claimed_month INTEGER NOT NULL DEFAULT 0,
+        month_key TEXT NOT NULL DEFAULT ''
+    )""",
+    """CREATE TABLE IF NOT EXISTS redemptions (
+        id BIGSERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL REFERENCES users(id),
+        qty INTEGER NOT NULL,
+        admin_note TEXT,
+        ts TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+    )""",
+    """CREATE TABLE IF NOT EXISTS history (
+        id BIGSERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL REFERENCES users(id),
+        valid INTEGER NOT NULL,
+        ts TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+        image_path TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS point_adjustments (
+        id BIGSERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL REFERENCES users(id),
+        delta INTEGER NOT NULL,
+        note TEXT,
+        ts TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+    )""",
+    """CREATE TABLE IF NOT EXISTS history_daily (
+        day TEXT PRIMARY KEY,
+        valid INTEGER NOT NULL DEFAULT 0,
+        invalid INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS blobs (
+        key TEXT PRIMARY KEY,
+        data BYTEA NOT NULL,
+        size INTEGER NOT NULL,
+        ts DOUBLE PRECISION NOT NULL
+    )""",
+    """CREATE OR REPLACE FUNCTION history_daily_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO history_daily AS d (day, valid, invalid)
+            VALUES (to_char(NEW.ts, 'YYYY-MM-DD'), (NEW.valid <> 0)::int, (NEW.valid = 0)::int)
+            ON CONFLICT (day) DO UPDATE SET valid = d.valid + excluded.valid, invalid = d.invalid + excluded.invalid;
+            RETURN NEW;
+        END IF;
+        UPDATE history_daily SET valid = valid - (OLD.valid <> 0)::int, invalid = invalid - (OLD.valid = 0)::int
+        WHERE day = to_char(OLD.ts, 'YYYY-MM-DD');
+        RETURN OLD;
+    END $$""",
+    """CREATE OR REPLACE TRIGGER trg_history_daily AFTER INSERT OR DELETE ON history
+       FOR EACH ROW EXECUTE FUNCTION history_daily_apply()""",
+    "CREATE INDEX IF NOT EXISTS idx_history_user_ts ON history (user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_history_ts ON history (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_redemptions_user_ts ON redemptions (user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_users_points ON users (points DESC, id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_name ON users (lower(name), id)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_outstanding ON tickets (available DESC, user_id) WHERE available > 0",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_month_key ON tickets (month_key)",
+    "CREATE INDEX IF NOT EXISTS idx_point_adjustments_user_ts ON point_adjustments (user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_blobs_ts ON blobs (ts)",
+]
+PG_LEDGER = [
+    """CREATE TABLE IF NOT EXISTS ledger (
+        id BIGSERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        kind SMALLINT NOT NULL,
+        points INTEGER NOT NULL DEFAULT 0,
+        tickets INTEGER NOT NULL DEFAULT 0,
+        ref BIGINT,
+        ts BIGINT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_ledger_user_id ON ledger (user_id, id)",
+    """CREATE TABLE IF NOT EXISTS ledger_snapshots (
+        user_id TEXT PRIMARY KEY,
+        last_id BIGINT NOT NULL,
+        points INTEGER NOT NULL,
+        tickets INTEGER NOT NULL
+    )""",
+    _LEDGER_OPENING.format(now="extract(epoch FROM now())::bigint"),
+    _LEDGER_SNAPSHOT_ALL,
+]
+PG_NAME_KEY = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS name_key TEXT NOT NULL DEFAULT ''",
+    fill_name_keys,
+    "DROP INDEX IF EXISTS idx_users_name",
+    "CREATE INDEX IF NOT EXISTS idx_users_name_key ON users (name_key, id)",
+]
+PG_MIGRATIONS = [(8, PG_SCHEMA), (9, PG_LEDGER), (10, PG_NAME_KEY)]
+
+
+def migrate_pg(conn) -> int:
+    """Postgres counterpart of migrate(); concurrent starters serialize on a table lock."""
+    collation = conn.execute("SELECT datcollate FROM pg_database WHERE datname = current_database()").fetchone()[0]
+    if collation not in ("C", "POSIX", "C.UTF-8", "C.utf8"):
+        # keyset cursors and prefix ranges assume byte-order text comparison, as in SQLite
+        warnings.warn(f"database collation is {collation!r}; create it with LC_COLLATE 'C' for correct "
+                      "prefix search and pagination order")
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    conn.execute("BEGIN")
+    try:
+        conn.execute("LOCK TABLE schema_version IN EXCLUSIVE MODE")
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        current = row[0] or 0
+        for version, statements in PG_MIGRATIONS:
+            if version > current:
+                for sql in statements:
+                    sql(conn) if callable(sql) else conn.execute(sql)
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                current = version
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return current
+
+
+# ---------------- RUNNER ----------------
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = LATEST_VERSION) -> int:
+    """Apply pending steps up to `target`; returns the resulting version."""
+    applied = False
+    for version, step in MIGRATIONS:
+        if version > target or schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:  # another process may have won the race
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied = True
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    if applied:
+        conn.execute("PRAGMA optimize")  # refresh planner stats for new indexes
+    return schema_version(conn)
+
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def ensure_schema(conn: sqlite3.Connection, db_path: str):
+    """Run migrations at most once per process for each database file."""
+    if db_path in _migrated:
+        return
+    with _migrated_lock:
+        if db_path in _migrated:
+            return
+        if getattr(conn, "dialect", "sqlite") == "postgres":
+            migrate_pg(conn)
+        else:
+            migrate(conn)
+        _migrated.add(db_path)
@@ -0,0 +1,26 @@
+"""Search key for student names: case- and accent-insensitive.
+
+users.name_key holds name_key(name) (migration v10) and backs the name prefix
+search, so "an" finds "Ángela" and "o" finds "Óscar". SQLite's lower() folds
+ASCII only, hence the key is computed here, on every write of a name.
+"""
+import unicodedata
+
+
+def name_key(text: str) -> str:
+    """Casefolded, accents stripped (NFKD without combining marks), trimmed."""
+    decomposed = unicodedata.normalize("NFKD", text.strip())
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def fill_name_keys(conn, batch: int = 1000):
+    """Set name_key for every user whose key is missing or stale (migrations, repair)."""
+    after = ""
+    while True:
+        rows = conn.execute("SELECT id, name, name_key FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                            (after, batch)).fetchall()
+        if not rows:
+            return
+        conn.executemany("UPDATE users SET name_key = ? WHERE id = ?",
+                         [(name_key(name), user_id) for user_id, name, key in rows if key != name_key(name)])
+        after = rows[-1][0]
@@ -0,0 +1,192 @@
+"""Class-wide admin reports: leaderboard, capture counts, outstanding tickets.
+
+Every list is keyset-paginated (pass the `cursor` returned with the previous
+page) and served from an index, so a page costs the same at row 10 and at row
+500,000. Daily/monthly capture counts come from history_daily, which triggers
+keep up to date on every history insert (migration v5). CSV exports stream
+rows in chunks from one read transaction and never build a DataFrame.
+
+Usage (from the repo root):
+    python -m database.reports leaderboard -o leaderboard.csv
+    python -m database.reports monthly
+"""
+import argparse
+import csv
+import io
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+from database.names import name_key
+from database.repository import Page, connection, init_db, set_db_path, transaction
+from monitoring.metrics import timed
+
+PAGE_SIZE = 25
+EXPORT_CHUNK = 1000
+_PREFIX_END = "\U0010ffff"  # sorts after every character: [prefix, prefix + _PREFIX_END) is a range scan
+
+
+def _page(rows: list, limit: int, cursor_of) -> Page:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return Page(rows, cursor_of(rows[-1]))
+    return Page(rows, None)
+
+
+# ---------------- STUDENTS ----------------
+@timed("db_call_seconds")
+def leaderboard(cursor: Optional[tuple] = None, limit: int = PAGE_SIZE) -> Page:
+    """(id, name, points) by points, highest first; cursor = (points, id)."""
+    with connection() as conn:
+        if cursor is None:
+            rows = conn.execute(
+                "SELECT id, name, points FROM users ORDER BY points DESC, id LIMIT ?", (limit + 1,)
+            ).fetchall()
+        else:
+            points, user_id = cursor
+            rows = conn.execute("""
+                SELECT id, name, points FROM users
+                WHERE points <= ? AND (points < ? OR id > ?)
+                ORDER BY points DESC, id LIMIT ?
+            """, (points, points, user_id, limit + 1)).fetchall()
+    return _page(rows, limit, lambda r: (r[2], r[0]))
+
+
+@timed("db_call_seconds")
+def search_users(prefix: str, by: str = "name", cursor: Optional[tuple] = None, limit: int = PAGE_SIZE) -> Page:
+    """(id, name, points) whose name (ignoring case and accents) or ID starts with `prefix`."""
+    prefix = prefix.strip()
+    if by == "id":
+        lo, hi = prefix, prefix + _PREFIX_END
+        after = cursor[0] if cursor else ""
+        sql = """
+            SELECT id, name, points FROM users
+            WHERE id >= ? AND id < ? AND id > ?
+            ORDER BY id LIMIT ?
+        """
+        params = (lo, hi, after, limit + 1)
+        cursor_of = lambda r: (r[0],)
+    elif by == "name":
+        lo = name_key(prefix)
+        hi = lo + _PREFIX_END
+        after_name, after_id = cursor if cursor else ("", "")
+        sql = """
+            SELECT id, name, points FROM users
+            WHERE name_key >= ? AND name_key < ? AND (name_key, id) > (?, ?)
+            ORDER BY name_key, id LIMIT ?
+        """
+        params = (lo, hi, after_name, after_id, limit + 1)
+        cursor_of = lambda r: (name_key(r[1]), r[0])
+    else:
+        raise ValueError(f"Unknown search field: {by}")
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return _page(rows, limit, cursor_of)
+
+
+# ---------------- TICKETS ----------------
+@timed("db_call_seconds")
+def outstanding_totals() -> Tuple[int, int]:
+    """(students holding tickets, tickets not yet redeemed)."""
+    with connection() as conn:
+        students, tickets = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(available), 0) FROM tickets WHERE available > 0"
+        ).fetchone()
+    return students, tickets
+
+
+@timed("db_call_seconds")
+def outstanding_tickets(cursor: Optional[tuple] = None, limit: int = PAGE_SIZE) -> Page:
+    """(id, name, available) for students holding tickets, most first; cursor = (available, id)."""
+    available, user_id = cursor if cursor else (1 << 62, "")
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT t.user_id, u.name, t.available
+            FROM tickets t JOIN users u ON u.id = t.user_id
+            WHERE t.available > 0 AND t.available <= ? AND (t.available < ? OR t.user_id > ?)
+            ORDER BY t.available DESC, t.user_id LIMIT ?
+        """, (available, available, user_id, limit + 1)).fetchall()
+    return _page(rows, limit, lambda r: (r[2], r[0]))
+
+
+# ---------------- CAPTURES ----------------
+@timed("db_call_seconds")
+def daily_counts(cursor: Optional[tuple] = None, limit: int = 31) -> Page:
+    """(day, valid, invalid), newest day first; cursor = (day,)."""
+    before = cursor[0] if cursor else "9999-12-31"
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT day, valid, invalid FROM history_daily WHERE day < ? ORDER BY day DESC LIMIT ?",
+            (before, limit + 1),
+        ).fetchall()
+    return _page(rows, limit, lambda r: (r[0],))
+
+
+@timed("db_call_seconds")
+def monthly_counts(months: int = 12) -> List[tuple]:
+    """(month, valid, invalid) for the most recent `months` months with captures."""
+    with connection() as conn:
+        return conn.execute("""
+            SELECT substr(day, 1, 7) AS month, SUM(valid), SUM(invalid)
+            FROM history_daily GROUP BY month ORDER BY month DESC LIMIT ?
+        """, (months,)).fetchall()
+
+
+# ---------------- CSV EXPORT ----------------
+EXPORTS = {
+    "leaderboard": (["id", "name", "points"],
+                    "SELECT id, name, points FROM users ORDER BY points DESC, id"),
+    "outstanding": (["id", "name", "available"],
+                    """SELECT t.user_id, u.name, t.available FROM tickets t JOIN users u ON u.id = t.user_id
+                       WHERE t.available > 0 ORDER BY t.available DESC, t.user_id"""),
+    "daily":       (["day", "valid", "invalid"],
+                    "SELECT day, valid, invalid FROM history_daily ORDER BY day"),
+    "monthly":     (["month", "valid", "invalid"],
+                    """SELECT substr(day, 1, 7) AS month, SUM(valid), SUM(invalid)
+                       FROM history_daily GROUP BY month ORDER BY month"""),
+    "redemptions": (["id", "user_id", "qty", "admin_note", "ts"],
+                    "SELECT id, user_id, qty, admin_note, ts FROM redemptions ORDER BY id"),
+}
+
+
+def iter_csv(kind: str, chunk: int = EXPORT_CHUNK) -> Iterator[bytes]:
+    """UTF-8 CSV of an export, yielded `chunk` rows at a time from one consistent snapshot."""
+    header, sql = EXPORTS[kind]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    with transaction() as conn:
+        cur = conn.execute(sql)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            writer.writerows(rows)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("kind", choices=sorted(EXPORTS))
+    ap.add_argument("-o", "--output", default="-", help="CSV file (default: stdout)")
+    ap.add_argument("--db", default="", help="database file (default: RECYCLE_DB_PATH)")
+    args = ap.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+    init_db()
+
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for part in iter_csv(args.kind):
+            out.write(part)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,594 @@
+import functools
+import os
+import queue
+from collections import OrderedDict
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from database.migrations import ensure_schema
+from database.names import name_key
+from database.pg import PgConnection, is_busy, is_postgres_url
+from monitoring.metrics import inc, span, timed
+
+DB_PATH      = os.getenv("RECYCLE_DB_URL") or os.getenv("RECYCLE_DB_PATH", os.path.join("data", "recycle.db"))
+POOL_SIZE    = int(os.getenv("RECYCLE_DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.getenv("RECYCLE_DB_BUSY_TIMEOUT_MS", "5000"))
+BUSY_RETRIES = int(os.getenv("RECYCLE_DB_BUSY_RETRIES", "5"))
+VIEW_CACHE_TTL_SECS = float(os.getenv("RECYCLE_VIEW_CACHE_TTL_SECS", "30"))  # 0 disables
+VIEW_CACHE_MAX_ENTRIES = int(os.getenv("RECYCLE_VIEW_CACHE_MAX_ENTRIES", "4096"))
+SNAPSHOT_EVERY = int(os.getenv("RECYCLE_LEDGER_SNAPSHOT_EVERY", "32"))  # events per user between snapshots
+
+# ---------------- CONNECTION POOL ----------------
+# Connections are shared across threads (Streamlit runs each rerun on a fresh
+# thread), so they are opened with check_same_thread=False and handed out one
+# borrower at a time. Autocommit mode: transactions are explicit via transaction().
+# DB_PATH may also be a postgresql:// URL (see database/pg.py).
+_pool = queue.LifoQueue()
+_pool_lock = threading.Lock()
+
+
+def _open():
+    if is_postgres_url(DB_PATH):
+        return PgConnection(DB_PATH)
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=256,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")
+    return conn
+
+
+def set_db_path(path: str):
+    """Point the repository at another database file or postgresql:// URL (tools, benchmarks)."""
+    global DB_PATH
+    with _pool_lock:
+        DB_PATH = path
+    close_all()
+    invalidate_user()
+
+
+def close_all():
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection (statements run in autocommit mode)."""
+    path = DB_PATH
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if path == DB_PATH and _pool.qsize() < POOL_SIZE:
+            _pool.put(conn)
+        else:
+            conn.close()
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """One transaction on a pooled connection; IMMEDIATE takes the write lock up front."""
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+# ---------------- BUSY RETRY ----------------
+_busy_lock = threading.Lock()
+_busy_retries = 0
+
+
+def busy_retry_count() -> int:
+    """How many times a write had to be retried because the database was locked."""
+    return _busy_retries
+
+
+def _is_busy_error(exc: BaseException) -> bool:
+    if isinstance(exc, sqlite3.OperationalError):
+        msg = str(exc).lower()
+        return "locked" in msg or "busy" in msg
+    return is_busy(exc)  # Postgres serialization failure / deadlock
+
+
+def retry_on_busy(fn):
+    """Re-run a write with jittered exponential backoff on 'database is locked' (or a Postgres conflict)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        global _busy_retries
+        delay = 0.01
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == BUSY_RETRIES or not _is_busy_error(e):
+                    raise
+            with _busy_lock:
+                _busy_retries += 1
+            inc("db_busy_retries_total", fn=fn.__name__)
+            time.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, 0.5)
+    return wrapper
+
+
+def month_key_now() -> str:
+    return datetime.now().strftime("%Y-%m")
+
+
+# ---------------- SCHEMA ----------------
+_schema_ready = set()
+
+
+def init_db():
+    """Bring the schema up to date (see database/migrations.py); once per process."""
+    db_path = DB_PATH if is_postgres_url(DB_PATH) else os.path.abspath(DB_PATH)
+    if db_path in _schema_ready:
+        return  # every Streamlit rerun calls this; don't even borrow a connection
+    with span("db_call_seconds", fn="init_db"), connection() as conn:
+        ensure_schema(conn, db_path)
+    _schema_ready.add(db_path)
+
+
+# ---------------- STATEMENTS ----------------
+# Kept as constants so each pooled connection reuses its prepared statement.
+SQL_USER           = "SELECT name, points FROM users WHERE id = ?"
+SQL_POINTS         = "SELECT points FROM users WHERE id = ?"
+SQL_TICKETS        = "SELECT available, claimed_month, month_key FROM tickets WHERE user_id = ?"
+SQL_INSERT_TICKETS = "INSERT OR IGNORE INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, 0, 0, '')"
+SQL_SET_TICKETS    = "UPDATE tickets SET available=?, claimed_month=?, month_key=? WHERE user_id=?"
+SQL_ADD_POINTS     = "UPDATE users SET points = points + ? WHERE id = ?"
+SQL_PUSH_HISTORY   = "INSERT INTO history (user_id, valid) VALUES (?, ?)"
+SQL_RECORD_HISTORY = SQL_PUSH_HISTORY + " RETURNING id"  # portable lastrowid (SQLite >= 3.35, Postgres)
+SQL_ADD_TICKETS    = "UPDATE tickets SET available = available + ? WHERE user_id = ?"
+SQL_LEDGER_APPEND  = "INSERT INTO ledger (user_id, kind, points, tickets, ref, ts) VALUES (?, ?, ?, ?, ?, ?)"
+# snapshot row + the events after it (idx_ledger_user_id); at most SNAPSHOT_EVERY rows
+SQL_LEDGER_BALANCE = """
+    SELECT COALESCE(SUM(points), 0), COALESCE(SUM(tickets), 0), COALESCE(SUM(tail), 0), MAX(id) FROM (
+        SELECT last_id AS id, points, tickets, 0 AS tail FROM ledger_snapshots WHERE user_id = ?
+        UNION ALL
+        SELECT id, points, tickets, 1 FROM ledger
+        WHERE user_id = ? AND id > COALESCE((SELECT last_id FROM ledger_snapshots WHERE user_id = ?), 0)
+    ) AS t
+"""
+SQL_LEDGER_SNAPSHOT = """
+    INSERT INTO ledger_snapshots (user_id, last_id, points, tickets) VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET last_id = excluded.last_id, points = excluded.points, tickets = excluded.tickets
+"""
+
+
+# ---------------- LEDGER ----------------
+# Points and available tickets are the sum of an append-only event log. Every
+# write appends its event(s) and updates the users.points / tickets.available
+# counters in the same transaction, so the counters stay an exact projection
+# (reports and the leaderboard keep their indexes). Balances are read from the
+# per-user snapshot plus the short tail after it; a user's snapshot is folded
+# forward once the tail reaches SNAPSHOT_EVERY events. database/ledger.py
+# rebuilds snapshots and counters from the log in batches.
+LEDGER_KINDS = {"opening": 0, "capture_valid": 1, "ticket_claim": 2, "redemption": 3, "admin_adjust": 4}
+
+
+class Balance(NamedTuple):
+    points: int
+    tickets: int
+
+
+def _balance(conn, user_id: str) -> Tuple[Balance, int, Optional[int]]:
+    """(balance, events after the snapshot, last event id) inside the caller's transaction."""
+    points, tickets, tail, last_id = conn.execute(SQL_LEDGER_BALANCE, (user_id, user_id, user_id)).fetchone()
+    return Balance(points, tickets), tail, last_id
+
+
+def _append(conn, user_id: str, kind: str, points: int = 0, tickets: int = 0, ref: Optional[int] = None):
+    """Append one event and apply it to the counters; call inside an IMMEDIATE transaction."""
+    conn.execute(SQL_LEDGER_APPEND, (user_id, LEDGER_KINDS[kind], points, tickets, ref, int(time.time())))
+    if points:
+        conn.execute(SQL_ADD_POINTS, (points, user_id))
+    if tickets:
+        conn.execute(SQL_ADD_TICKETS, (tickets, user_id))
+    balance, tail, last_id = _balance(conn, user_id)
+    if tail >= SNAPSHOT_EVERY:
+        conn.execute(SQL_LEDGER_SNAPSHOT, (user_id, last_id, balance.points, balance.tickets))
+        inc("ledger_snapshots_total")
+
+
+def append_events(conn, kind: str, rows):
+    """Batched _append() for (user_id, points, tickets) rows of one kind (bulk tools); call inside an
+    IMMEDIATE transaction. Users whose tail reaches SNAPSHOT_EVERY get their snapshot folded."""
+    rows = list(rows)
+    if not rows:
+        return
+    now, code = int(time.time()), LEDGER_KINDS[kind]
+    conn.executemany(SQL_LEDGER_APPEND, ((u, code, p, t, None, now) for u, p, t in rows))
+    conn.executemany(SQL_ADD_POINTS, ((p, u) for u, p, _ in rows if p))
+    conn.executemany(SQL_ADD_TICKETS, ((t, u) for u, _, t in rows if t))
+    users = sorted({u for u, _, _ in rows})
+    placeholders = ",".join("?" * len(users))
+    due = [u for (u,) in conn.execute(f"""
+        SELECT l.user_id FROM ledger l LEFT JOIN ledger_snapshots s ON s.user_id = l.user_id
+        WHERE l.user_id IN ({placeholders}) AND l.id > COALESCE(s.last_id, 0)
+        GROUP BY l.user_id HAVING COUNT(*) >= ?
+    """, (*users, SNAPSHOT_EVERY))]
+    for user_id in due:
+        balance, _, last_id = _balance(conn, user_id)
+        conn.execute(SQL_LEDGER_SNAPSHOT, (user_id, last_id, balance.points, balance.tickets))
+    if due:
+        inc("ledger_snapshots_total", len(due))
+
+
+def open_balances(conn, rows):
+    """Opening events for (user_id, points, tickets) rows seeded straight into users/tickets (tools, tests)."""
+    now = int(time.time())
+    conn.executemany(SQL_LEDGER_APPEND, ((u, LEDGER_KINDS["opening"], p, t, None, now) for u, p, t in rows))
+
+
+@timed("db_call_seconds")
+def get_balance(user_id: str) -> Balance:
+    """Points and available tickets from the ledger (snapshot + tail)."""
+    with connection() as conn:
+        return _balance(conn, user_id)[0]
+
+
+# ---------------- USERS & POINTS ----------------
+@timed("db_call_seconds")
+@retry_on_busy
+def ensure_ticket_row(user_id: str):
+    with connection() as conn:
+        conn.execute(SQL_INSERT_TICKETS, (user_id,))
+
+
+@timed("db_call_seconds")
+@retry_on_busy
+def create_user(user_id: str, name: str):
+    with transaction(immediate=True) as conn:
+        conn.execute("INSERT OR IGNORE INTO users (id, name, name_key) VALUES (?, ?, ?)",
+                     (user_id, name, name_key(name)))
+        conn.execute(SQL_INSERT_TICKETS, (user_id,))
+    invalidate_user(user_id)
+
+
+def get_points(user_id: str) -> int:
+    return get_balance(user_id).points
+
+
+@timed("db_call_seconds")
+@retry_on_busy
+def record_capture(user_id: str, valid: bool, points: int = 1) -> int:
+    """Log a capture and, if valid, append its capture_valid event in the same transaction; returns the history id."""
+    with transaction(immediate=True) as conn:
+        history_id = conn.execute(SQL_RECORD_HISTORY, (user_id, int(valid))).fetchone()[0]
+        if valid and points:
+            _append(conn, user_id, "capture_valid", points=points, ref=history_id)
+    if valid and points:
+        invalidate_user(user_id)
+    return history_id
+
+
+@timed("db_call_seconds")
+@retry_on_busy
+def set_history_image(history_id: int, image_path: str):
+    with connection() as conn:
+        conn.execute("UPDATE history SET image_path = ? WHERE id = ?", (image_path, history_id))
+
+
+# ---------------- TICKETS ----------------
+@timed("db_call_seconds")
+def get_ticket_info(user_id: str) -> Tuple[int, int, str]:
+    """Return (available, claimed_month, month_key); read-only."""
+    with transaction() as conn:
+        row = conn.execute(SQL_TICKETS, (user_id,)).fetchone()
+        if not row:
+            return (0, 0, "")
+        available = _balance(conn, user_id)[0].tickets
+    return available, row[1], row[2]
+
+
+def _claimed_this_month(claimed_month: int, month_key: str, current_key: str) -> int:
+    # Between a month boundary and the next rollover_month() run a row can
+    # still carry last month's key; its count no longer applies.
+    return claimed_month if month_key == current_key else 0
+
+
+def _claimable(points: int, claimed_month: int) -> int:
+    by_points = points // 15
+    by_limit  = max(0, 3 - claimed_month)  # max 3 / month
+    return max(0, min(by_points, by_limit))
+
+
+@timed("db_call_seconds")
+def claimable_tickets_now(user_id: str) -> int:
+    """How many tickets can be claimed now: min(points//15, 3 - claimed_this_month)."""
+    state = get_dashboard_state(user_id)
+    return state.claimable if state else 0
+
+
+# ---------------- MONTHLY ROLLOVER ----------------
+@timed("db_call_seconds")
+@retry_on_busy
+def rollover_month(month_key: Optional[str] = None) -> int:
+    """Start a new claim month for every ticket row in one statement; returns rows reset.
+
+    Idempotent and cheap when nothing is due (idx_tickets_month_key).
+    """
+    month_key = month_key or month_key_now()
+    with transaction(immediate=True) as conn:
+        reset = conn.execute(
+            # month_key <> ?, spelled as two ranges so idx_tickets_month_key can serve it
+            "UPDATE tickets SET claimed_month = 0, month_key = ? WHERE month_key < ? OR month_key > ?",
+            (month_key, month_key, month_key),
+        ).rowcount
+    if reset:
+        invalidate_user()
+        inc("month_rollover_rows_total", reset)
+    return reset
+
+
+def _seconds_to_next_month(now: datetime) -> float:
+    first = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+    return (first - now).total_seconds()
+
+
+_rollover_thread = None
+_rollover_lock = threading.Lock()
+
+
+def start_rollover_scheduler(max_sleep_secs: float = 3600.0):
+    """Run rollover_month() now and after every month boundary (daemon thread, once per process).
+
+    Sleeps are capped at `max_sleep_secs` so clock changes or a suspended
+    kiosk only delay the reset, never skip it. Every kiosk process may run
+    one; the UPDATE is idempotent.
+    """
+    global _rollover_thread
+
+    def loop():
+        while True:
+            try:
+                rollover_month()
+            except Exception:  # keep the schedule alive; the next pass retries
+                inc("month_rollover_errors_total")
+            time.sleep(min(max_sleep_secs, _seconds_to_next_month(datetime.now()) + 1))
+
+    with _rollover_lock:
+        if _rollover_thread is None:
+            _rollover_thread = threading.Thread(target=loop, name="month-rollover", daemon=True)
+            _rollover_thread.start()
+    return _rollover_thread
+
+
+@timed("db_call_seconds")
+@retry_on_busy
+def claim_one_ticket(user_id: str) -> bool:
+    """Try to claim 1 ticket (cost 15 points). Return True if success."""
+    current_key = month_key_now()
+    # check, append the -15 points / +1 ticket event and increment claimed_month under one write lock
+    with transaction(immediate=True) as conn:
+        row = conn.execute(SQL_TICKETS, (user_id,)).fetchone()
+        if not row:
+            return False
+        _, claimed_month, month_key = row
+        claimed_month = _claimed_this_month(claimed_month, month_key, current_key)
+        if _claimable(_balance(conn, user_id)[0].points, claimed_month) <= 0:
+            return False
+        _append(conn, user_id, "ticket_claim", points=-15, tickets=1)
+        conn.execute("UPDATE tickets SET claimed_month = ?, month_key = ? WHERE user_id = ?",
+                     (claimed_month + 1, current_key, user_id))
+    invalidate_user(user_id)
+    return True
+
+
+@timed("db_call_seconds")
+@retry_on_busy
+def redeem_tickets(user_id: str, qty: int, admin_note: str = "") -> bool:
+    """Teacher redeem `qty` tickets from student's available balance."""
+    if qty <= 0:
+        return False
+    with transaction(immediate=True) as conn:
+        # checked under the write lock: never goes below zero, even with concurrent redeems
+        if _balance(conn, user_id)[0].tickets < qty:
+            return False
+        redemption_id = conn.execute(
+            "INSERT INTO redemptions (user_id, qty, admin_note) VALUES (?, ?, ?) RETURNING id",
+            (user_id, qty, admin_note),
+        ).fetchone()[0]
+        _append(conn, user_id, "redemption", tickets=-qty, ref=redemption_id)
+    invalidate_user(user_id)
+    return True
+
+
+@timed("db_call_seconds")
+def redemptions_for_user(user_id: str):
+    with connection() as conn:
+        return conn.execute(
+            "SELECT ts, qty, admin_note FROM redemptions WHERE user_id = ? ORDER BY ts DESC", (user_id,)
+        ).fetchall()
+
+
+class Page(NamedTuple):
+    rows: list
+    cursor: Optional[tuple]  # pass back to get the next page; None on the last page
+
+
+@timed("db_call_seconds")
+def redemptions_page(user_id: str, cursor: Optional[tuple] = None, limit: int = 20) -> Page:
+    """(ts, qty, admin_note) newest first, keyset-paginated on (ts, id) via idx_redemptions_user_ts."""
+    ts, rid = cursor if cursor else ("9999-12-31", 1 << 62)
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT ts, qty, admin_note, id FROM redemptions
+            WHERE user_id = ? AND (ts, id) < (?, ?)
+            ORDER BY ts DESC, id DESC LIMIT ?
+        """, (user_id, ts, rid, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return Page([r[:3] for r in rows], (rows[-1][0], rows[-1][3]) if more else None)
+
+
+# ---------------- BLOBS ----------------
+# Backing table of the IMG_STORE=db image store (storage/blobs.py).
+@timed("db_call_seconds")
+@retry_on_busy
+def put_blob(key: str, data: bytes, ts: float):
+    """Store `data` under `key`; an existing key only has its timestamp refreshed."""
+    with connection() as conn:
+        if conn.execute("UPDATE blobs SET ts = ? WHERE key = ?", (ts, key)).rowcount:
+            return  # content-addressed: same key, same bytes; don't ship them again
+        conn.execute(
+            "INSERT INTO blobs (key, data, size, ts) VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET ts = excluded.ts",
+            (key, data, len(data), ts),
+        )
+
+
+@timed("db_call_seconds")
+def get_blob(key: str) -> Optional[bytes]:
+    with connection() as conn:
+        row = conn.execute("SELECT data FROM blobs WHERE key = ?", (key,)).fetchone()
+    return bytes(row[0]) if row else None
+
+
+@timed("db_call_seconds")
+@retry_on_busy
+def prune_blobs(older_than: float = 0, max_total_bytes: int = 0) -> int:
+    """Delete blobs last put before `older_than`, then oldest-first down to max_total_bytes."""
+    with transaction(immediate=True) as conn:
+        removed = conn.execute("DELETE FROM blobs WHERE ts < ?", (older_than,)).rowcount if older_than else 0
+        if not max_total_bytes:
+            return removed
+        excess = (conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]) - max_total_bytes
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM blobs ORDER BY ts"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM blobs WHERE key = ?", doomed)
+    return removed + len(doomed)
+
+
+# ---------------- VIEW STATE ----------------
+class DashboardState(NamedTuple):
+    name: str
+    points: int
+    available: int
+    claimed_month: int
+    month_key: str
+    claimable: int
+
+
+@timed("db_call_seconds")
+def get_dashboard_state(user_id: str) -> Optional[DashboardState]:
+    """User, ledger balance, tickets and claimable count from one read transaction (no writes)."""
+    if not user_id:
+        return None
+    with transaction() as conn:
+        user = conn.execute(SQL_USER, (user_id,)).fetchone()
+        if not user:
+            return None
+        tickets = conn.execute(SQL_TICKETS, (user_id,)).fetchone()
+        points, available = _balance(conn, user_id)[0]
+    name = user[0]
+    _, claimed_month, month_key = tickets or (0, 0, "")
+    current_key = month_key_now()
+    claimed_month, month_key = _claimed_this_month(claimed_month, month_key, current_key), current_key
+    return DashboardState(name, points, available, claimed_month, month_key, _claimable(points, claimed_month))
+
+
+# ---------------- VIEW CACHE ----------------
+# Per-user read models for the Streamlit views. Streamlit reruns the whole
+# script on every widget interaction; with this cache an idle rerun issues no
+# SQL. Every helper above that writes a user's points, tickets or redemptions
+# calls invalidate_user(), so this process always sees its own writes at once.
+# Writes from other processes (a second kiosk on the same file) show up after
+# at most VIEW_CACHE_TTL_SECS. The cache is an LRU of at most
+# VIEW_CACHE_MAX_ENTRIES; misses (None, e.g. an unknown ID) are not cached.
+_view_cache = OrderedDict()  # (kind, user_id) -> (expires_at, value), least recently used first
+_view_generation = {}        # user_id -> bumped on every invalidation
+_view_epoch = 0              # bumped when _view_generation is reset (invalidate everyone)
+_view_lock = threading.Lock()
+
+
+def _reset_generations():
+    global _view_epoch
+    _view_epoch += 1  # readers that started before this must not store
+    _view_generation.clear()
+
+
+def invalidate_user(user_id: Optional[str] = None):
+    """Drop cached view data for `user_id` (everyone when None)."""
+    with _view_lock:
+        if user_id is None:
+            _view_cache.clear()
+            _reset_generations()
+            return
+        _view_generation[user_id] = _view_generation.get(user_id, 0) + 1
+        if len(_view_generation) > VIEW_CACHE_MAX_ENTRIES:
+            _reset_generations()  # keeps the table bounded; only in-flight reads are affected
+        for key in [k for k in _view_cache if k[1] == user_id]:
+            del _view_cache[key]
+
+
+def _cached_view(kind: str, user_id: str, load):
+    if not user_id or VIEW_CACHE_TTL_SECS <= 0:
+        return load(user_id)
+    key = (kind, user_id)
+    now = time.monotonic()
+    with _view_lock:
+        hit = _view_cache.get(key)
+        if hit is not None:
+            if hit[0] > now:
+                _view_cache.move_to_end(key)
+                inc("view_cache_total", result="hit")
+                return hit[1]
+            del _view_cache[key]
+        token = (_view_epoch, _view_generation.get(user_id, 0))
+    inc("view_cache_total", result="miss")
+    value = load(user_id)
+    if value is None:
+        return value
+    with _view_lock:
+        # a write that landed while we were reading makes this value stale
+        if (_view_epoch, _view_generation.get(user_id, 0)) == token:
+            _view_cache[key] = (now + VIEW_CACHE_TTL_SECS, value)
+            _view_cache.move_to_end(key)
+            while len(_view_cache) > VIEW_CACHE_MAX_ENTRIES:
+                _view_cache.popitem(last=False)
+    return value
+
+
+def cached_dashboard_state(user_id: str) -> Optional[DashboardState]:
+    """get_dashboard_state() served from the view cache."""
+    state = _cached_view("dashboard", user_id, get_dashboard_state)
+    if state is not None and state.month_key != month_key_now():
+        invalidate_user(user_id)  # cached across a month boundary
+        state = _cached_view("dashboard", user_id, get_dashboard_state)
+    return state
+
+
+def cached_redemptions(user_id: str) -> Page:
+    """First redemptions_page() served from the view cache."""
+    return _cached_view("redemptions", user_id, redemptions_page)
@@ -1,25 +1,14 @@
-import sqlite3
 import os
+import sqlite3
+import sys
 
-os.makedirs("data", exist_ok=True)
-conn = sqlite3.connect('data/recycle.db')
-cursor = conn.cursor()
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS users (
-    id TEXT PRIMARY KEY,
-    name TEXT,
-    points INTEGER DEFAULT 0
-)
-''')
+# Allow `python database/setup_db.py` as well as `python -m database.setup_db`.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS history (
-    user_id TEXT,
-    valid BOOLEAN,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-)
-''')
+from database.migrations import migrate  # noqa: E402
 
-conn.commit()
+os.makedirs("data", exist_ok=True)
+conn = sqlite3.connect('data/recycle.db')
+version = migrate(conn)
 conn.close()
+print(f"data/recycle.db at schema version {version}")
@@ -0,0 +1,185 @@
+"""Concurrency stress test for the points/tickets flows.
+
+Simulates many students capturing bottles, claiming tickets and teachers
+redeeming them in parallel threads and processes against one SQLite file,
+then checks the invariants and reports throughput.
+
+Usage (from the repo root):
+    python -m database.stress_test --users 300 --processes 4 --threads 8 --ops 500
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from database import repository as repo
+
+INITIAL_POINTS = 40
+
+
+def seed(db_path: str, users: int):
+    repo.set_db_path(db_path)
+    repo.init_db()
+    with repo.transaction(immediate=True) as conn:
+        conn.executemany(
+            "INSERT INTO users (id, name, points) VALUES (?, ?, ?)",
+            [(f"s{i:05d}", f"Student {i}", INITIAL_POINTS) for i in range(users)],
+        )
+        conn.executemany(
+            "INSERT INTO tickets (user_id, available, claimed_month, month_key) VALUES (?, 0, 0, '')",
+            [(f"s{i:05d}",) for i in range(users)],
+        )
+        repo.open_balances(conn, [(f"s{i:05d}", INITIAL_POINTS, 0) for i in range(users)])
+
+
+def _thread_worker(users: int, ops: int, seed_value: int, totals: dict, lock: threading.Lock):
+    rnd = random.Random(seed_value)
+    local = {"captures": 0, "awarded": 0, "claims": 0, "redeemed": 0, "failed": 0, "errors": 0}
+    for _ in range(ops):
+        # a small hot set of users maximises contention on the same rows
+        user_id = f"s{rnd.randrange(min(users, 20) if rnd.random() < 0.3 else users):05d}"
+        action = rnd.random()
+        try:
+            if action < 0.5:
+                valid = rnd.random() < 0.8
+                repo.record_capture(user_id, valid, 1)
+                local["captures"] += 1
+                local["awarded"] += int(valid)
+            elif action < 0.8:
+                if repo.claim_one_ticket(user_id):
+                    local["claims"] += 1
+                else:
+                    local["failed"] += 1
+            else:
+                qty = rnd.randint(1, 2)
+                if repo.redeem_tickets(user_id, qty, "stress"):
+                    local["redeemed"] += qty
+                else:
+                    local["failed"] += 1
+        except sqlite3.Error:
+            local["errors"] += 1
+    with lock:
+        for k, v in local.items():
+            totals[k] = totals.get(k, 0) + v
+
+
+def run_process(db_path: str, users: int, threads: int, ops: int, seed_value: int, out_queue=None):
+    repo.set_db_path(db_path)
+    totals, lock = {}, threading.Lock()
+    workers = [
+        threading.Thread(target=_thread_worker, args=(users, ops, seed_value * 1000 + i, totals, lock))
+        for i in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    totals["busy_retries"] = repo.busy_retry_count()
+    if out_queue is not None:
+        out_queue.put(totals)
+    return totals
+
+
+def check_invariants(db_path: str, users: int, totals: dict) -> list:
+    conn = sqlite3.connect(db_path)
+    problems = []
+    points, = conn.execute("SELECT COALESCE(SUM(points), 0) FROM users").fetchone()
+    expected_points = users * INITIAL_POINTS + totals["awarded"] - 15 * totals["claims"]
+    if points != expected_points:
+        problems.append(f"points: {points} in DB, expected {expected_points}")
+    negative, = conn.execute("SELECT COUNT(*) FROM users WHERE points < 0").fetchone()
+    if negative:
+        problems.append(f"{negative} users with negative points")
+    available, claimed = conn.execute("SELECT SUM(available), SUM(claimed_month) FROM tickets").fetchone()
+    if claimed != totals["claims"]:
+        problems.append(f"claimed_month total {claimed}, expected {totals['claims']}")
+    if available != totals["claims"] - totals["redeemed"]:
+        problems.append(f"available {available}, expected {totals['claims'] - totals['redeemed']}")
+    over, = conn.execute("SELECT COUNT(*) FROM tickets WHERE claimed_month > 3 OR available < 0").fetchone()
+    if over:
+        problems.append(f"{over} ticket rows over the monthly limit or negative")
+    redeemed, = conn.execute("SELECT COALESCE(SUM(qty), 0) FROM redemptions").fetchone()
+    if redeemed != totals["redeemed"]:
+        problems.append(f"redemptions log {redeemed}, expected {totals['redeemed']}")
+    drifted, = conn.execute("""
+        SELECT COUNT(*) FROM users u JOIN tickets t ON t.user_id = u.id
+        LEFT JOIN (SELECT user_id, SUM(points) AS points, SUM(tickets) AS tickets FROM ledger GROUP BY user_id) l
+            ON l.user_id = u.id
+        WHERE u.points <> COALESCE(l.points, 0) OR t.available <> COALESCE(l.tickets, 0)
+    """).fetchone()
+    if drifted:
+        problems.append(f"{drifted} users whose counters differ from their ledger")
+    stale, = conn.execute("""
+        SELECT COUNT(*) FROM ledger_snapshots s
+        WHERE (s.points, s.tickets) <> (SELECT COALESCE(SUM(points), 0), COALESCE(SUM(tickets), 0) FROM ledger
+                                        WHERE user_id = s.user_id AND id <= s.last_id)
+    """).fetchone()
+    if stale:
+        problems.append(f"{stale} ledger snapshots that don't match their events")
+    history, = conn.execute("SELECT COUNT(*) FROM history").fetchone()
+    if history != totals["captures"]:
+        problems.append(f"history rows {history}, expected {totals['captures']}")
+    conn.close()
+    return problems
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--processes", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8, help="threads per process")
+    ap.add_argument("--ops", type=int, default=300, help="operations per thread")
+    ap.add_argument("--db", default="", help="database file (default: a temporary file)")
+    args = ap.parse_args(argv)
+
+    tmpdir = None
+    db_path = args.db
+    if not db_path:
+        tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmpdir.name, "stress.db")
+    seed(db_path, args.users)
+
+    t0 = time.perf_counter()
+    if args.processes <= 1:
+        results = [run_process(db_path, args.users, args.threads, args.ops, 0)]
+    else:
+        ctx = mp.get_context("spawn")
+        out = ctx.Queue()
+        procs = [
+            ctx.Process(target=run_process, args=(db_path, args.users, args.threads, args.ops, i, out))
+            for i in range(args.processes)
+        ]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+    elapsed = time.perf_counter() - t0
+
+    totals = {}
+    for r in results:
+        for k, v in r.items():
+            totals[k] = totals.get(k, 0) + v
+    total_ops = args.processes * args.threads * args.ops if args.processes > 1 else args.threads * args.ops
+    print(f"{total_ops} ops in {elapsed:.2f} s -> {total_ops / elapsed:.0f} ops/s")
+    print("  " + ", ".join(f"{k}={v}" for k, v in sorted(totals.items())))
+
+    repo.close_all()
+    problems = check_invariants(db_path, args.users, totals)
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    if problems or totals.get("errors"):
+        for p in problems:
+            print("FAIL:", p)
+        return 1
+    print("invariants OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Interchangeable inference backends for the bottle classifier.
+
+Every backend takes a float32 RGB batch (N, 224, 224, 3) in 0..255 and returns
+ImageNet probabilities (N, 1000) from predict(); infer() is the same forward
+pass on an already preprocessed batch. Decoding to (id, label, prob) tuples is shared,
+so all backends feed is_plastic_bottle_from_predictions() the same way.
+
+Backends:
+  keras   - Keras application model (resnet50 or mobilenet_v2), needs TensorFlow
+  tflite  - converted .tflite graph (int8 quantized), needs tflite-runtime,
+            ai-edge-litert or TensorFlow
+  onnx    - converted .onnx graph, needs onnxruntime
+
+Use model/export_backends.py to produce the .tflite / .onnx files.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+MODEL_DIR     = os.path.dirname(os.path.abspath(__file__))
+ARTIFACTS_DIR = os.path.join(MODEL_DIR, "artifacts")
+CLASS_INDEX_PATH = os.path.join(ARTIFACTS_DIR, "imagenet_class_index.json")
+CLASS_INDEX_URL  = "https://storage.googleapis.com/download.tensorflow.org/data/imagenet_class_index.json"
+CLASS_INDEX_HASH = "c2c37ea517e94d9795004a39431a14cb"
+
+# caffe: RGB->BGR + ImageNet mean (ResNet50); tf: scale to [-1, 1] (MobileNetV2)
+PREPROCESS_MODE = {
+    "resnet50": "caffe",
+    "mobilenet_v2": "tf",
+}
+_CAFFE_MEAN = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+
+def preprocess(batch: np.ndarray, arch: str) -> np.ndarray:
+    """Numpy equivalent of keras.applications.<arch>.preprocess_input."""
+    x = np.asarray(batch, dtype=np.float32)
+    mode = PREPROCESS_MODE[arch]
+    if mode == "caffe":
+        return x[..., ::-1] - _CAFFE_MEAN
+    return x / 127.5 - 1.0
+
+
+# ---------------- LABELS ----------------
+_class_index = None
+
+
+def _load_class_index():
+    global _class_index
+    if _class_index is None:
+        if os.path.exists(CLASS_INDEX_PATH):
+            with open(CLASS_INDEX_PATH, "r", encoding="utf-8") as f:
+                _class_index = json.load(f)
+        else:
+            # Falls back to Keras' cached copy (downloaded on first use).
+            from tensorflow.keras.utils import get_file
+            path = get_file("imagenet_class_index.json", CLASS_INDEX_URL,
+                            cache_subdir="models", file_hash=CLASS_INDEX_HASH)
+            with open(path, "r", encoding="utf-8") as f:
+                _class_index = json.load(f)
+    return _class_index
+
+
+def decode_predictions(probs: np.ndarray, top: int = 5):
+    """Same output as keras decode_predictions: per image, [(id, label, prob), ...]."""
+    index = _load_class_index()
+    results = []
+    for row in np.asarray(probs):
+        top_idx = np.argsort(row)[-top:][::-1]
+        results.append([(index[str(i)][0], index[str(i)][1], row[i]) for i in top_idx])
+    return results
+
+
+def save_class_index():
+    """Write the label map next to exported models so light backends need no Keras."""
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    with open(CLASS_INDEX_PATH, "w", encoding="utf-8") as f:
+        json.dump(_load_class_index(), f)
+
+
+# ---------------- BACKENDS ----------------
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, arch: str = "resnet50", weights: str = "imagenet"):
+        self.arch = arch
+        if arch == "resnet50":
+            from tensorflow.keras.applications.resnet50 import ResNet50 as build
+        elif arch == "mobilenet_v2":
+            from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2 as build
+        else:
+            raise ValueError(f"Unknown Keras architecture: {arch}")
+        self.model = build(weights=weights)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.infer(preprocess(batch, self.arch))
+
+    def infer(self, x: np.ndarray) -> np.ndarray:
+        """Forward pass on an already preprocessed batch."""
+        return self.model.predict(x, batch_size=len(x), verbose=0)
+
+
+def _tflite_interpreter(path: str):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=os.cpu_count())
+
+
+class TFLiteBackend:
+    name = "tflite"
+
+    def __init__(self, path: str, arch: str = "resnet50"):
+        self.arch = arch
+        self.path = path
+        self.interpreter = _tflite_interpreter(path)
+        self._batch = None
+        # the interpreter holds mutable tensors: one invoke at a time
+        self._lock = threading.Lock()
+
+    def _resize(self, n: int):
+        if self._batch != n:
+            inp = self.interpreter.get_input_details()[0]
+            self.interpreter.resize_tensor_input(inp["index"], [n, 224, 224, 3])
+            self.interpreter.allocate_tensors()
+            self._batch = n
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.infer(preprocess(batch, self.arch))
+
+    def infer(self, x: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._resize(len(x))
+            inp = self.interpreter.get_input_details()[0]
+            out = self.interpreter.get_output_details()[0]
+            scale, zero = inp["quantization"]
+            if scale:
+                x = np.clip(np.round(x / scale + zero), *_int_range(inp["dtype"]))
+            self.interpreter.set_tensor(inp["index"], x.astype(inp["dtype"]))
+            self.interpreter.invoke()
+            y = self.interpreter.get_tensor(out["index"])
+        scale, zero = out["quantization"]
+        if scale:
+            y = (y.astype(np.float32) - zero) * scale
+        return y
+
+
+def _int_range(dtype):
+    info = np.iinfo(dtype)
+    return info.min, info.max
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path: str, arch: str = "resnet50"):
+        import onnxruntime as ort
+
+        self.arch = arch
+        self.path = path
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.infer(preprocess(batch, self.arch))
+
+    def infer(self, x: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: x})[0]
+
+
+def artifact_path(kind: str, arch: str) -> str:
+    """Default location written by export_backends.py."""
+    if kind == "tflite":
+        return os.path.join(ARTIFACTS_DIR, f"{arch}_int8.tflite")
+    return os.path.join(ARTIFACTS_DIR, f"{arch}_int8.onnx")
+
+
+def create_backend(kind: str = "keras", arch: str = "resnet50", path: str = ""):
+    kind = (kind or "keras").lower()
+    if arch not in PREPROCESS_MODE:
+        raise ValueError(f"Unknown architecture: {arch}")
+    if kind == "keras":
+        return KerasBackend(arch)
+    if kind == "tflite":
+        return TFLiteBackend(path or artifact_path("tflite", arch), arch)
+    if kind == "onnx":
+        return OnnxBackend(path or artifact_path("onnx", arch), arch)
+    raise ValueError(f"Unknown backend: {kind}")
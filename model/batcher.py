@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Collect concurrent single-image requests and run them as one batch.
+
+    `predict_fn` receives a stacked array (N, H, W, C) and must return a list
+    with one result per row. A batch is dispatched as soon as `max_batch`
+    requests are waiting or the oldest one has waited `max_wait_ms`.
+    """
+
+    def __init__(self, predict_fn, max_batch: int = 8, max_wait_ms: float = 10.0, history: int = 1000):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=history)
+        self._latencies = deque(maxlen=history)
+        self._requests = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name="classifier-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, x: np.ndarray) -> Future:
+        fut = Future()
+        self._queue.put((x, fut, time.perf_counter()))
+        return fut
+
+    def predict(self, x: np.ndarray, timeout=None):
+        return self.submit(x).result(timeout)
+
+    def _collect(self):
+        items = [self._queue.get()]
+        deadline = items[0][2] + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            live = [item for item in items if item[1].set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                results = self.predict_fn(np.stack([x for x, _, _ in live]))
+            except Exception as e:
+                for _, fut, _ in live:
+                    fut.set_exception(e)
+                continue
+            done = time.perf_counter()
+            for (_, fut, t0), res in zip(live, results):
+                fut.set_result(res)
+            with self._stats_lock:
+                self._requests += len(live)
+                self._batches += 1
+                self._batch_sizes.append(len(live))
+                self._latencies.extend((done - t0) * 1000.0 for _, _, t0 in live)
+
+    def stats(self) -> dict:
+        """Counters plus batch-size and latency (ms) percentiles over recent requests."""
+        with self._stats_lock:
+            sizes = np.array(self._batch_sizes, dtype=np.float64)
+            lats = np.array(self._latencies, dtype=np.float64)
+            out = {
+                "requests": self._requests,
+                "batches": self._batches,
+                "queue_depth": self._queue.qsize(),
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+        if sizes.size:
+            out["batch_size_mean"] = float(sizes.mean())
+            out["batch_size_max"] = int(sizes.max())
+        if lats.size:
+            p50, p95, p99 = np.percentile(lats, [50, 95, 99])
+            out.update(latency_p50_ms=float(p50), latency_p95_ms=float(p95), latency_p99_ms=float(p99))
+        return out
@@ -0,0 +1,182 @@
+"""Per-stage latency benchmark and regression gate for the classifier.
+
+Stages: cold model load (fresh interpreter), image decode + resize,
+preprocess, forward pass, decode_predictions and the capture-view border
+annotation, over the images/ sample set at several batch sizes and caller
+thread counts.
+
+Usage (from the repo root):
+    python -m model.bench_inference --save bench_baseline.json
+    python -m model.bench_inference --compare bench_baseline.json --threshold 0.25
+
+--compare exits with status 1 when any stage's p50 or p95 is more than
+`threshold` (fraction) slower than the baseline.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import ImageOps
+
+from model.backends import create_backend, decode_predictions, preprocess
+from model.classifier import ARCH, BACKEND, MODEL_PATH, load_image, to_input_array
+
+_COLD_LOAD = (
+    "import time; t = time.perf_counter(); "
+    "from model.backends import create_backend; "
+    "create_backend({kind!r}, {arch!r}, {path!r}); "
+    "print(time.perf_counter() - t)"
+)
+
+
+def summarize(samples_ms) -> dict:
+    a = np.asarray(samples_ms, dtype=np.float64)
+    return {"n": int(a.size), "p50": float(np.percentile(a, 50)), "p95": float(np.percentile(a, 95)),
+            "mean": float(a.mean())}
+
+
+def timed(fn, repeat: int):
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def bench_cold_load(kind: str, arch: str, path: str, runs: int) -> list:
+    samples = []
+    code = _COLD_LOAD.format(kind=kind, arch=arch, path=path)
+    for _ in range(runs):
+        res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        samples.append(float(res.stdout.strip().splitlines()[-1]) * 1000.0)
+    return samples
+
+
+def bench_threads(backend, arch: str, arrays, batch_size: int, threads: int, rounds: int) -> dict:
+    """Concurrent callers each running `rounds` predicts; per-call latency plus throughput."""
+    batch = np.stack([arrays[i % len(arrays)] for i in range(batch_size)])
+    x = preprocess(batch, arch)
+    latencies, lock = [], threading.Lock()
+
+    def worker():
+        local = timed(lambda: backend.infer(x), rounds)
+        with lock:
+            latencies.extend(local)
+
+    t0 = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    stats = summarize(latencies)
+    stats["images_per_sec"] = threads * rounds * batch_size / elapsed
+    return stats
+
+
+def run(args) -> dict:
+    paths = sorted(glob.glob(os.path.join(args.images, "*.jpg")))
+    raw = [open(p, "rb").read() for p in paths]
+    if not raw:
+        raise SystemExit(f"No .jpg images in {args.images}")
+    results = {}
+
+    if args.cold_runs:
+        results["cold_load"] = summarize(bench_cold_load(args.backend, args.arch, args.model_path, args.cold_runs))
+
+    results["decode"] = summarize(timed(lambda: [to_input_array(load_image(b)) for b in raw], args.repeat))
+    images = [load_image(b) for b in raw]
+    arrays = [to_input_array(img) for img in images]
+    results["annotate"] = summarize(timed(lambda: [ImageOps.expand(img, border=12, fill="green") for img in images],
+                                          args.repeat))
+
+    backend = create_backend(args.backend, args.arch, args.model_path)
+    for bs in args.batch_sizes:
+        batch = np.stack([arrays[i % len(arrays)] for i in range(bs)])
+        x = preprocess(batch, args.arch)
+        backend.infer(x)  # warm-up: graph tracing / allocation for this batch shape
+        probs = backend.infer(x)
+        results[f"preprocess[bs={bs}]"] = summarize(timed(lambda: preprocess(batch, args.arch), args.repeat))
+        results[f"predict[bs={bs}]"] = summarize(timed(lambda: backend.infer(x), args.repeat))
+        results[f"decode_predictions[bs={bs}]"] = summarize(timed(lambda: decode_predictions(probs, top=5), args.repeat))
+        for th in args.threads:
+            if th > 1:
+                results[f"predict[bs={bs},threads={th}]"] = bench_threads(
+                    backend, args.arch, arrays, bs, th, max(1, args.repeat // th))
+
+    # decode and annotate are reported per image to stay comparable across sample sets
+    for key in ("decode", "annotate"):
+        for stat in ("p50", "p95", "mean"):
+            results[key][stat] /= len(raw)
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    failures = []
+    print(f"{'stage':<36} {'base p50':>10} {'p50':>10} {'base p95':>10} {'p95':>10}")
+    for stage, base in baseline["stages"].items():
+        cur = current.get(stage)
+        if cur is None:
+            continue
+        flag = ""
+        for stat in ("p50", "p95"):
+            if base[stat] > 0 and cur[stat] > base[stat] * (1 + threshold):
+                failures.append(f"{stage} {stat}: {base[stat]:.2f} -> {cur[stat]:.2f} ms")
+                flag = "  REGRESSION"
+        print(f"{stage:<36} {base['p50']:>8.2f}ms {cur['p50']:>8.2f}ms {base['p95']:>8.2f}ms {cur['p95']:>8.2f}ms{flag}")
+    return failures
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backend", default=BACKEND)
+    ap.add_argument("--arch", default=ARCH)
+    ap.add_argument("--model-path", default=MODEL_PATH)
+    ap.add_argument("--images", default="images")
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--cold-runs", type=int, default=2, help="fresh-process model loads (0 to skip)")
+    ap.add_argument("--save", default="", help="write results as a JSON baseline")
+    ap.add_argument("--compare", default="", help="baseline JSON to check against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown fraction")
+    args = ap.parse_args(argv)
+
+    stages = run(args)
+    doc = {
+        "meta": {"backend": args.backend, "arch": args.arch, "python": platform.python_version(),
+                 "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "created": time.strftime("%Y-%m-%d %H:%M:%S")},
+        "stages": stages,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+        print(f"baseline written to {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = compare(stages, baseline, args.threshold)
+        if failures:
+            print("\nRegressions beyond {:.0%}:".format(args.threshold))
+            for line in failures:
+                print("  " + line)
+            return 1
+        print("\nNo regressions.")
+    elif not args.save:
+        for stage, s in stages.items():
+            print(f"{stage:<36} p50 {s['p50']:>9.2f} ms   p95 {s['p95']:>9.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Throughput cost vs. retry reduction of multi-crop TTA (CLASSIFIER_TTA=crops).
+
+Runs every image through the plain single-view check and, for the ones it
+rejects, the batched second look on tta_views(), the same path is_bottle()
+takes (the result cache is bypassed): tta_verdict() accepts when the mean
+bottle score over the plain view and the crops reaches --min-score.
+Positives are photos of plastic bottles; negatives (no bottle, glass bottles)
+give the false-accept rate of both modes, which must be checked before
+raising --min-prob or lowering --min-score in production.
+
+A rejected bottle means the student retries. With acceptance rate a, a bottle
+takes 1/a attempts on average, so the model work per credited bottle is
+(forward passes per attempt) / a. TTA pays off when that number goes down.
+
+Usage (from the repo root):
+    python -m model.bench_tta bottles/ --negatives not_bottles/ --min-prob 0.1 --min-score 0.15
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from model.classifier import (
+    BOTTLE_MIN_PROB, TTA_CROP, TTA_MIN_SCORE, get_model, is_plastic_bottle_from_predictions, load_image,
+    predict_arrays, to_input_array, tta_verdict, tta_views,
+)
+from model.classify_dir import iter_inputs
+
+
+def evaluate(paths, min_prob: float, crop: float, min_score: float) -> dict:
+    plain = rescued = passes = 0
+    plain_secs = tta_secs = 0.0
+    for path in paths:
+        img = load_image(path)
+        t0 = time.perf_counter()
+        decoded = predict_arrays(np.expand_dims(to_input_array(img), axis=0))[0]
+        plain_secs += time.perf_counter() - t0
+        passes += 1
+        if is_plastic_bottle_from_predictions(decoded, min_prob):
+            plain += 1
+            continue
+        t0 = time.perf_counter()
+        views = predict_arrays(tta_views(img, crop))
+        tta_secs += time.perf_counter() - t0
+        passes += len(views)
+        rescued += tta_verdict(decoded, views, min_score, min_prob) is not None
+    n = max(len(paths), 1)
+    return {"n": len(paths), "plain": plain / n, "tta": (plain + rescued) / n,
+            "plain_ips": n / max(plain_secs, 1e-9), "tta_ips": n / max(plain_secs + tta_secs, 1e-9),
+            "passes_per_attempt": passes / n}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("positives", nargs="*", default=["images"], help="plastic-bottle images or directories")
+    ap.add_argument("--negatives", nargs="*", default=[], help="images that must be rejected")
+    ap.add_argument("--min-prob", type=float, default=BOTTLE_MIN_PROB)
+    ap.add_argument("--crop", type=float, default=TTA_CROP)
+    ap.add_argument("--min-score", type=float, default=TTA_MIN_SCORE, help="mean bottle score over the views")
+    args = ap.parse_args(argv)
+
+    get_model()
+    pos = evaluate(list(iter_inputs(args.positives)), args.min_prob, args.crop, args.min_score)
+    print(f"positives: {pos['n']} images, min_prob={args.min_prob}, crop={args.crop}, min_score={args.min_score}")
+    print(f"{'mode':<6} {'accepted':>9} {'attempts/bottle':>16} {'images/s':>9} {'passes/bottle':>14}")
+    for mode, rate, ips, passes in (("plain", pos["plain"], pos["plain_ips"], 1.0),
+                                    ("crops", pos["tta"], pos["tta_ips"], pos["passes_per_attempt"])):
+        attempts = 1 / rate if rate else float("inf")
+        print(f"{mode:<6} {rate:>9.1%} {attempts:>16.2f} {ips:>9.1f} {passes * attempts:>14.2f}")
+    if pos["plain"]:
+        saved = 1 - pos["plain"] / pos["tta"] if pos["tta"] else 0.0
+        print(f"retries per bottle: {1 / pos['plain'] - 1:.2f} -> {1 / pos['tta'] - 1:.2f}; "
+              f"throughput {pos['tta_ips'] / pos['plain_ips'] - 1:+.0%} per attempt, "
+              f"{saved:.0%} fewer attempts")
+    if args.negatives:
+        neg = evaluate(list(iter_inputs(args.negatives)), args.min_prob, args.crop, args.min_score)
+        print(f"negatives: {neg['n']} images, false accepts {neg['plain']:.1%} plain -> {neg['tta']:.1%} crops")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 difference hash -> 64-bit key
+
+
+def image_hash(img: Image.Image) -> int:
+    """64-bit difference hash (dHash); memoized on the image so callers can share it."""
+    cached = img.info.get("_dhash")
+    if cached is not None:
+        return cached
+    small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    px = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        base = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (px[base + col] > px[base + col + 1])
+    img.info["_dhash"] = value
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class ResultCache:
+    """Bounded LRU + TTL cache of classifier results keyed by (perceptual hash, variant).
+
+    Lookups are exact: a verdict is only reused for the same image hash and the
+    same `variant` (the caller's TTA mode and threshold), never for a nearby
+    photo. `model` names the backend/arch that produced the results; with
+    `db_path` set, entries are also written to a SQLite table and only the
+    current model's rows are reloaded on start.
+
+    is_duplicate() matches a user's recent submissions within `dup_distance`
+    bits (distinct captures at one kiosk are ~5 bits apart, re-encodes of the
+    same photo 0-2).
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_secs: float = 86400, model: str = "",
+                 db_path: str = "", dup_window_secs: float = 600, dup_distance: int = 1):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_secs)
+        self.model = model
+        self.dup_window = float(dup_window_secs)
+        self.dup_distance = int(dup_distance)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (hash, variant) -> (result, ts)
+        self._submissions = OrderedDict()  # user_id -> OrderedDict(hash -> ts), least recent user first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            self._init_db()
+            self._load()
+
+    # ---------- persistence ----------
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("DROP TABLE IF EXISTS classifier_cache")  # keyed by hash alone; not safe to reuse
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS classifier_verdicts (
+                model TEXT NOT NULL,
+                phash TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                result TEXT NOT NULL,
+                ts REAL NOT NULL,
+                PRIMARY KEY (model, phash, variant)
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT phash, variant, result, ts FROM classifier_verdicts WHERE model = ? AND ts >= ? "
+            "ORDER BY ts DESC LIMIT ?",
+            (self.model, cutoff, self.max_entries),
+        ).fetchall()
+        conn.execute("DELETE FROM classifier_verdicts WHERE ts < ?", (cutoff,))
+        conn.commit()
+        conn.close()
+        for phash, variant, result, ts in reversed(rows):
+            self._entries[(int(phash, 16), variant)] = (_decode_result(result), ts)
+
+    def _persist(self, key, result, ts: float):
+        phash, variant = key
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO classifier_verdicts (model, phash, variant, result, ts) VALUES (?, ?, ?, ?, ?)",
+                (self.model, f"{phash:016x}", variant, _encode_result(result), ts),
+            )
+            conn.commit()
+            conn.close()
+        except sqlite3.Error:
+            pass  # the in-memory cache still works; persistence is best effort
+
+    # ---------- lookups ----------
+    def _find(self, key, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        result, ts = entry
+        if now - ts > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            result = self._find(key, now)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, key, result):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (result, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if self.db_path:
+            self._persist(key, result, now)
+
+    def is_duplicate(self, user_id: str, key: int) -> bool:
+        """Record a submission and report whether the user sent the same image recently."""
+        now = time.time()
+        with self._lock:
+            # users whose newest submission left the window are dropped whole
+            while self._submissions:
+                oldest = next(iter(self._submissions.values()))
+                if now - next(reversed(oldest.values())) <= self.dup_window:
+                    break
+                self._submissions.popitem(last=False)
+            seen = self._submissions.pop(user_id, None) or OrderedDict()
+            for other, ts in list(seen.items()):
+                if now - ts > self.dup_window:
+                    del seen[other]
+            dup = any(hamming(key, other) <= self.dup_distance for other in seen)
+            seen[key] = now
+            seen.move_to_end(key)
+            while len(seen) > 32:
+                seen.popitem(last=False)
+            self._submissions[user_id] = seen  # most recent user last
+            return dup
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
+
+
+def _encode_result(result) -> str:
+    is_valid, decoded = result
+    return json.dumps([bool(is_valid), [[i, lbl, float(p)] for i, lbl, p in decoded]])
+
+
+def _decode_result(text: str):
+    is_valid, decoded = json.loads(text)
+    return is_valid, [(i, lbl, p) for i, lbl, p in decoded]
@@ -1,16 +1,287 @@
-from tensorflow.keras.applications.resnet50 import ResNet50, preprocess_input, decode_predictions
-from tensorflow.keras.preprocessing import image
+import io
+import os
+import threading
+
 import numpy as np
+from PIL import Image
+
+from model.cache import ResultCache, image_hash
+from monitoring.metrics import inc, register_collector, span
+
+INPUT_SIZE = (224, 224)
+
+# Backend selection (see model/backends.py): keras | tflite | onnx, and the
+# architecture: resnet50 | mobilenet_v2. CLASSIFIER_MODEL_PATH overrides the
+# default artifact location for tflite/onnx.
+BACKEND    = os.getenv("CLASSIFIER_BACKEND", "keras")
+ARCH       = os.getenv("CLASSIFIER_ARCH", "resnet50")
+MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", "")
+
+# Optional micro-batching: CLASSIFIER_BATCH_MAX > 1 routes is_bottle() through a
+# shared worker that groups concurrent requests into one predict() call.
+BATCH_MAX     = int(os.getenv("CLASSIFIER_BATCH_MAX", "0"))
+BATCH_WAIT_MS = float(os.getenv("CLASSIFIER_BATCH_WAIT_MS", "10"))
+
+# Perceptual-hash result cache in front of the model (CLASSIFIER_CACHE_SIZE=0 disables).
+# Verdicts are reused for the exact same hash, model and TTA settings only.
+# CLASSIFIER_CACHE_DB persists it to SQLite, e.g. data/classifier_cache.db.
+CACHE_SIZE     = int(os.getenv("CLASSIFIER_CACHE_SIZE", "512"))
+CACHE_TTL_SECS = float(os.getenv("CLASSIFIER_CACHE_TTL_SECS", "86400"))
+CACHE_DB       = os.getenv("CLASSIFIER_CACHE_DB", "")
+DUP_WINDOW_SECS = float(os.getenv("CLASSIFIER_DUP_WINDOW_SECS", "600"))
+DUP_DISTANCE    = int(os.getenv("CLASSIFIER_DUP_DISTANCE", "1"))  # dHash bits; distinct captures are ~5 apart
+
+# Acceptance: a plastic-bottle label (not wine/beer) in the top 5 whose summed
+# probability reaches BOTTLE_MIN_PROB (0: any such label). Tune both thresholds
+# with `python -m model.bench_tta` on real kiosk photos before raising them.
+# CLASSIFIER_TTA=crops re-checks rejected photos on several crops (see is_bottle)
+# and accepts when the mean bottle score over all views reaches TTA_MIN_SCORE.
+BOTTLE_MIN_PROB = float(os.getenv("CLASSIFIER_BOTTLE_MIN_PROB", "0"))
+TTA_MODE        = os.getenv("CLASSIFIER_TTA", "off").lower()    # off | crops
+TTA_CROP        = float(os.getenv("CLASSIFIER_TTA_CROP", "0.7"))  # crop side, fraction of the photo
+TTA_MIN_SCORE   = float(os.getenv("CLASSIFIER_TTA_MIN_SCORE", "0.15"))
+
+# ---------------- MODEL REGISTRY ----------------
+# One model per process, shared by every Streamlit session and rerun.
+# The backend (and TensorFlow, if used) is imported on the loader thread, never at module import time,
+# so the first screen renders without waiting for it.
+_lock = threading.Lock()
+_model = None
+_load_thread = None
+_load_error = None
+
+
+def _build_model():
+    from model.backends import create_backend
+    return create_backend(BACKEND, ARCH, MODEL_PATH)
+
+
+def _load():
+    global _model, _load_error
+    try:
+        model = _build_model()
+    except Exception as e:  # surfaced through model_status()/get_model()
+        with _lock:
+            _load_error = e
+        return
+    with _lock:
+        _model = model
+        _load_error = None
+
+
+def warm_up():
+    """Start loading the model in the background (no-op if loaded or loading)."""
+    global _load_thread, _load_error
+    with _lock:
+        if _model is not None:
+            return
+        if _load_thread is not None and _load_thread.is_alive():
+            return
+        _load_error = None
+        _load_thread = threading.Thread(target=_load, name="classifier-loader", daemon=True)
+        _load_thread.start()
+
+
+def model_status() -> str:
+    """Return 'idle', 'loading', 'ready' or 'error'."""
+    with _lock:
+        if _model is not None:
+            return "ready"
+        if _load_error is not None:
+            return "error"
+        if _load_thread is not None and _load_thread.is_alive():
+            return "loading"
+        return "idle"
+
+
+def model_error():
+    return _load_error
+
+
+def get_model(timeout=None):
+    """Return the shared model, starting/waiting for the load if needed."""
+    warm_up()
+    thread = _load_thread
+    if thread is not None:
+        thread.join(timeout)
+    with _lock:
+        if _model is not None:
+            return _model
+        if _load_error is not None:
+            raise RuntimeError("Classifier failed to load") from _load_error
+    raise TimeoutError("Classifier is still loading")
+
+
+# ---------------- INPUT ----------------
+def load_image(source) -> Image.Image:
+    """Decode raw bytes, a file path, a PIL image or an array into an RGB PIL image."""
+    if isinstance(source, Image.Image):
+        img = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        img = Image.open(io.BytesIO(source))
+    elif isinstance(source, np.ndarray):
+        img = Image.fromarray(source.astype(np.uint8) if source.dtype != np.uint8 else source)
+    elif isinstance(source, (str, os.PathLike)):
+        img = Image.open(source)
+    else:
+        raise TypeError(f"Unsupported image source: {type(source).__name__}")
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def to_input_array(img: Image.Image) -> np.ndarray:
+    """Resize once to the model input size; returns float32 HxWx3 (RGB, 0..255)."""
+    if img.size != INPUT_SIZE:
+        # nearest matches keras.preprocessing.image.load_img's default
+        img = img.resize(INPUT_SIZE, Image.NEAREST)
+    return np.asarray(img, dtype=np.float32)
+
+
+# ---------------- INFERENCE ----------------
+_batcher = None
+_cache = None
+if CACHE_SIZE > 0:
+    _cache = ResultCache(CACHE_SIZE, CACHE_TTL_SECS, f"{BACKEND}/{ARCH}/{MODEL_PATH}", CACHE_DB,
+                         DUP_WINDOW_SECS, DUP_DISTANCE)
+
+
+def predict_arrays(batch: np.ndarray):
+    """Run the model on a (N, 224, 224, 3) RGB batch; returns top-5 decoded per image."""
+    from model.backends import decode_predictions
 
-model = ResNet50(weights='imagenet')
+    probs = get_model().predict(batch)
+    return decode_predictions(probs, top=5)
 
-def is_bottle(img_path):
-    img = image.load_img(img_path, target_size=(224, 224))
-    x = image.img_to_array(img)
-    x = np.expand_dims(x, axis=0)
-    x = preprocess_input(x)
 
-    preds = model.predict(x)
-    decoded = decode_predictions(preds, top=5)[0]
-    is_valid = any("bottle" in label.lower() for (_, label, _) in decoded)
+def enable_batching(max_batch: int = 8, max_wait_ms: float = 10.0):
+    """Route is_bottle() through a shared MicroBatcher (idempotent per process)."""
+    global _batcher
+    from model.batcher import MicroBatcher
+
+    with _lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(predict_arrays, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        return _batcher
+
+
+def batching_stats():
+    """Batch-size / latency stats of the batching worker, or None if disabled."""
+    return _batcher.stats() if _batcher is not None else None
+
+
+def cache_stats():
+    """Hit/miss counters of the result cache, or None if disabled."""
+    return _cache.stats() if _cache is not None else None
+
+
+def is_duplicate_submission(user_id: str, source) -> bool:
+    """True if this user already submitted a (near-)identical image recently."""
+    if _cache is None or not user_id:
+        return False
+    return _cache.is_duplicate(user_id, image_hash(load_image(source)))
+
+
+def tta_views(img: Image.Image, crop: float = TTA_CROP) -> np.ndarray:
+    """Center and four corner crops plus the mirrored photo, as one (6, 224, 224, 3) batch."""
+    w, h = img.size
+    cw, ch = max(1, int(w * crop)), max(1, int(h * crop))
+    left, top = (w - cw) // 2, (h - ch) // 2
+    boxes = [(left, top), (0, 0), (w - cw, 0), (0, h - ch), (w - cw, h - ch)]
+    views = [img.crop((x, y, x + cw, y + ch)) for x, y in boxes]
+    views.append(img.transpose(Image.FLIP_LEFT_RIGHT))
+    return np.stack([to_input_array(v) for v in views])
+
+
+def tta_verdict(decoded, views, min_score: float = TTA_MIN_SCORE, min_prob: float = BOTTLE_MIN_PROB):
+    """Predictions of the best view if the mean bottle score over the plain view and
+    the crops reaches `min_score` (one lucky crop is not enough), else None."""
+    candidates = [decoded, *views]
+    scores = [bottle_score(p) for p in candidates]
+    if sum(scores) / len(scores) < min_score:
+        return None
+    best = candidates[max(range(len(scores)), key=scores.__getitem__)]
+    return best if is_plastic_bottle_from_predictions(best, min_prob) else None
+
+
+def _second_look(img: Image.Image, decoded):
+    """tta_verdict() over tta_views(), else the original predictions."""
+    with span("classifier_seconds", stage="tta"):
+        views = predict_arrays(tta_views(img))
+    rescued = tta_verdict(decoded, views)
+    inc("classifier_tta_total", result="rescued" if rescued is not None else "rejected")
+    return rescued if rescued is not None else decoded
+
+
+def is_bottle(source, tta: str = TTA_MODE):
+    """Classify one image. `source` may be bytes, a path, a PIL image or an array.
+
+    With tta="crops", a photo whose plain view is not a plastic bottle gets a
+    second, batched look at tta_views() (see tta_verdict); accepted photos exit
+    after the first pass. The verdict is is_plastic_bottle_from_predictions().
+    """
+    img = load_image(source)
+    key = None
+    if _cache is not None:
+        key = (image_hash(img), f"{tta}/{BOTTLE_MIN_PROB:g}/{TTA_MIN_SCORE:g}")
+        hit = _cache.get(key)
+        if hit is not None:
+            return hit
+
+    with span("classifier_seconds", stage="preprocess"):
+        x = to_input_array(img)
+    with span("classifier_seconds", stage="predict"):
+        if _batcher is not None:
+            decoded = _batcher.predict(x)
+        else:
+            decoded = predict_arrays(np.expand_dims(x, axis=0))[0]
+    if tta == "crops":
+        if is_plastic_bottle_from_predictions(decoded):
+            inc("classifier_tta_total", result="plain")
+        else:
+            decoded = _second_look(img, decoded)
+    is_valid = is_plastic_bottle_from_predictions(decoded)
+    if key is not None:
+        _cache.put(key, (is_valid, decoded))
     return is_valid, decoded
+
+
+def _plastic_labels(predictions):
+    """(label, prob) of the bottle labels that are not glass (wine/beer)."""
+    out = []
+    for _, lbl, prob in predictions:
+        lbl = lbl.lower()
+        if "bottle" in lbl and "wine" not in lbl and "beer" not in lbl:
+            out.append((lbl, float(prob)))
+    return out
+
+
+def bottle_score(predictions) -> float:
+    """Summed top-5 probability of plastic-bottle labels (water_bottle, pop_bottle, ...)."""
+    return sum(prob for _, prob in _plastic_labels(predictions))
+
+
+def is_plastic_bottle_from_predictions(predictions, min_prob: float = BOTTLE_MIN_PROB) -> bool:
+    """Accept when plastic-bottle labels are in the top 5 with at least `min_prob` in total."""
+    labels = _plastic_labels(predictions)
+    return bool(labels) and sum(prob for _, prob in labels) >= min_prob
+
+
+@register_collector
+def _collect_metrics():
+    """Cache, batcher and model-state gauges for the metrics endpoint."""
+    out = {("classifier_model_ready", ()): float(model_status() == "ready")}
+    cache = cache_stats()
+    if cache is not None:
+        for k in ("hits", "misses", "entries", "hit_ratio"):
+            out[(f"classifier_cache_{k}", ())] = cache[k]
+    batching = batching_stats()
+    if batching is not None:
+        for k in ("requests", "batches", "queue_depth", "batch_size_mean", "latency_p95_ms"):
+            if k in batching:
+                out[(f"classifier_batcher_{k}", ())] = batching[k]
+    return out
+
+
+if BATCH_MAX > 1:
+    enable_batching(BATCH_MAX, BATCH_WAIT_MS)
@@ -0,0 +1,181 @@
+"""Headless batch classification of image directories or manifests.
+
+Decoding runs in a process pool, inference in batches on the configured
+backend (CLASSIFIER_BACKEND / CLASSIFIER_ARCH), and results stream to CSV or
+Parquet as they are produced.
+
+Usage (from the repo root):
+    python -m model.classify_dir images/ -o results.csv
+    python -m model.classify_dir --manifest to_rescore.txt -o rescore.parquet --batch-size 32
+"""
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model.classifier import (
+    get_model, is_plastic_bottle_from_predictions, load_image, predict_arrays, to_input_array,
+)
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+COLUMNS = ["path", "is_plastic", "top1_label", "top1_prob", "labels", "probs", "error"]
+
+
+def iter_inputs(paths, manifest: str = ""):
+    """Yield image paths from directories (recursive), files and an optional manifest."""
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().split(",")[0]
+                if line and not line.startswith("#") and line != "path":
+                    yield line
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirnames, names in os.walk(p):
+                dirnames.sort()
+                for name in sorted(names):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTS:
+                        yield os.path.join(dirpath, name)
+        else:
+            yield p
+
+
+def _decode(path: str):
+    try:
+        return path, to_input_array(load_image(path)), ""
+    except Exception as e:
+        return path, None, f"{e.__class__.__name__}: {e}"
+
+
+def _row(path: str, decoded=None, error: str = "") -> dict:
+    if decoded is None:
+        return {"path": path, "is_plastic": None, "top1_label": None, "top1_prob": None,
+                "labels": None, "probs": None, "error": error}
+    return {
+        "path": path,
+        "is_plastic": is_plastic_bottle_from_predictions(decoded),
+        "top1_label": decoded[0][1],
+        "top1_prob": float(decoded[0][2]),
+        "labels": ";".join(lbl for _, lbl, _ in decoded),
+        "probs": ";".join(f"{float(p):.5f}" for _, _, p in decoded),
+        "error": "",
+    }
+
+
+class _CsvSink:
+    def __init__(self, path: str):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.w = csv.DictWriter(self.f, fieldnames=COLUMNS)
+        self.w.writeheader()
+
+    def write(self, rows):
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetSink:
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("path", pa.string()), ("is_plastic", pa.bool_()), ("top1_label", pa.string()),
+            ("top1_prob", pa.float32()), ("labels", pa.string()), ("probs", pa.string()), ("error", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if rows:
+            self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_sink(path: str):
+    return _ParquetSink(path) if path.endswith(".parquet") else _CsvSink(path)
+
+
+def classify(paths, sink, batch_size: int = 16, workers: int = 0, progress_every: int = 500):
+    """Stream paths through the decode pool and the model; returns (images, errors, seconds)."""
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    done = errors = 0
+    t0 = time.perf_counter()
+    batch_paths, batch_arrays = [], []
+
+    def flush():
+        nonlocal done
+        if not batch_arrays:
+            return
+        results = predict_arrays(np.stack(batch_arrays))
+        sink.write([_row(p, d) for p, d in zip(batch_paths, results)])
+        done += len(batch_arrays)
+        batch_paths.clear()
+        batch_arrays.clear()
+
+    def handle(result):
+        nonlocal errors
+        path, array, error = result
+        if array is None:
+            errors += 1
+            sink.write([_row(path, error=error)])
+            return
+        batch_paths.append(path)
+        batch_arrays.append(array)
+        if len(batch_arrays) >= batch_size:
+            flush()
+            if progress_every and done % progress_every < batch_size:
+                rate = done / (time.perf_counter() - t0)
+                print(f"  {done} images, {rate:.1f} img/s", file=sys.stderr)
+
+    # spawn: never fork a process that already holds TensorFlow threads
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # bounded in-flight window keeps memory flat on huge directories
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(_decode, path))
+            if len(pending) >= max(4 * batch_size, 8 * workers):
+                handle(pending.popleft().result())
+        while pending:
+            handle(pending.popleft().result())
+        flush()
+    return done, errors, time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("inputs", nargs="*", help="image files or directories")
+    ap.add_argument("--manifest", default="", help="text/CSV file with one image path per line")
+    ap.add_argument("-o", "--output", default="classify_results.csv", help=".csv or .parquet")
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--workers", type=int, default=0, help="decode processes (default: CPUs - 1)")
+    args = ap.parse_args(argv)
+    if not args.inputs and not args.manifest:
+        ap.error("give at least one input directory/file or --manifest")
+
+    t0 = time.perf_counter()
+    get_model()  # keep the one-off model load out of the throughput figure
+    print(f"model loaded in {time.perf_counter() - t0:.1f} s")
+
+    sink = open_sink(args.output)
+    try:
+        done, errors, secs = classify(iter_inputs(args.inputs, args.manifest), sink, args.batch_size, args.workers)
+    finally:
+        sink.close()
+    rate = done / secs if secs else 0.0
+    print(f"{done} images classified ({errors} unreadable) in {secs:.1f} s -> {rate:.1f} img/s; wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
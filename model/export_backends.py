@@ -0,0 +1,141 @@
+"""Export the classifier to TFLite/ONNX (int8) and check parity on images/.
+
+Usage (from the repo root):
+    python -m model.export_backends                      # export + verify
+    python -m model.export_backends --verify-only
+    python -m model.export_backends --arch mobilenet_v2 --formats tflite
+
+Exports need TensorFlow; ONNX additionally needs tf2onnx and onnxruntime.
+Verification runs every available backend over the sample images and compares
+the top-1 label and the plastic-bottle verdict with the Keras ResNet50 reference.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+from model.backends import (
+    ARTIFACTS_DIR, artifact_path, create_backend, decode_predictions, preprocess, save_class_index,
+)
+from model.classifier import is_plastic_bottle_from_predictions, load_image, to_input_array
+
+
+def sample_images(folder: str):
+    paths = sorted(glob.glob(os.path.join(folder, "*.jpg")) + glob.glob(os.path.join(folder, "*.png")))
+    arrays = [to_input_array(load_image(p)) for p in paths]
+    return paths, arrays
+
+
+def _serving_fn(keras_model):
+    import tensorflow as tf
+
+    @tf.function(input_signature=[tf.TensorSpec([None, 224, 224, 3], tf.float32, name="input")])
+    def serve(x):
+        return keras_model(x, training=False)
+    return serve
+
+
+def export_tflite(keras_model, arch: str, calib: list) -> str:
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    def representative():
+        for x in calib:
+            yield [preprocess(x[None], arch)]
+
+    # int8 weights and activations; float in/out keeps the backend contract simple
+    converter.representative_dataset = representative
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    out_path = artifact_path("tflite", arch)
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+def export_onnx(keras_model, arch: str) -> str:
+    import tf2onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    fn = _serving_fn(keras_model)
+    float_path = os.path.join(ARTIFACTS_DIR, f"{arch}_fp32.onnx")
+    tf2onnx.convert.from_function(fn, input_signature=fn.input_signature, opset=13, output_path=float_path)
+    out_path = artifact_path("onnx", arch)
+    quantize_dynamic(float_path, out_path, weight_type=QuantType.QInt8)
+    return out_path
+
+
+def run_backend(backend, arrays, batch_size: int = 8):
+    decoded = []
+    t0 = time.perf_counter()
+    for i in range(0, len(arrays), batch_size):
+        decoded.extend(decode_predictions(backend.predict(np.stack(arrays[i:i + batch_size])), top=5))
+    elapsed = time.perf_counter() - t0
+    return decoded, elapsed * 1000.0 / max(1, len(arrays))
+
+
+def verify(arrays, candidates, min_agreement: float) -> bool:
+    reference = create_backend("keras", "resnet50")
+    ref, ref_ms = run_backend(reference, arrays)
+    ref_top1 = [d[0][1] for d in ref]
+    ref_verdict = [is_plastic_bottle_from_predictions(d) for d in ref]
+
+    print(f"{'backend':<24} {'top1':>6} {'verdict':>8} {'ms/img':>8}")
+    print(f"{'keras/resnet50 (ref)':<24} {1.0:>6.2f} {1.0:>8.2f} {ref_ms:>8.1f}")
+    ok = True
+    for kind, arch in candidates:
+        label = f"{kind}/{arch}"
+        try:
+            backend = create_backend(kind, arch)
+        except Exception as e:
+            print(f"{label:<24} skipped ({e.__class__.__name__}: {e})")
+            continue
+        out, ms = run_backend(backend, arrays)
+        top1 = np.mean([d[0][1] == r for d, r in zip(out, ref_top1)])
+        verdict = np.mean([is_plastic_bottle_from_predictions(d) == r for d, r in zip(out, ref_verdict)])
+        print(f"{label:<24} {top1:>6.2f} {verdict:>8.2f} {ms:>8.1f}")
+        if verdict < min_agreement:
+            ok = False
+    return ok
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--arch", nargs="+", default=["resnet50", "mobilenet_v2"])
+    ap.add_argument("--formats", nargs="+", default=["tflite", "onnx"], choices=["tflite", "onnx"])
+    ap.add_argument("--images", default="images")
+    ap.add_argument("--min-agreement", type=float, default=0.9,
+                    help="minimum plastic-bottle verdict agreement with the reference")
+    ap.add_argument("--verify-only", action="store_true")
+    args = ap.parse_args(argv)
+
+    paths, arrays = sample_images(args.images)
+    if not arrays:
+        print(f"No images found in {args.images}")
+        return 1
+    print(f"{len(paths)} sample images from {args.images}")
+
+    if not args.verify_only:
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        save_class_index()
+        for arch in args.arch:
+            keras_model = create_backend("keras", arch).model
+            for fmt in args.formats:
+                try:
+                    path = export_tflite(keras_model, arch, arrays) if fmt == "tflite" else export_onnx(keras_model, arch)
+                except ImportError as e:
+                    print(f"{fmt}/{arch}: skipped, missing dependency ({e.name})")
+                    continue
+                print(f"{fmt}/{arch}: wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    candidates = [("keras", a) for a in args.arch if a != "resnet50"]
+    candidates += [(fmt, a) for a in args.arch for fmt in args.formats]
+    return 0 if verify(arrays, candidates, args.min_agreement) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Live camera capture: cheap per-frame gating in front of the full classifier.
+
+Frames from the browser (streamlit-webrtc) arrive at 15-30 fps. FrameGate
+keeps the expensive model off most of them:
+
+1. throttle   - look at no more than SAMPLE_FPS frames a second;
+2. exposure   - drop frames that are too dark or too bright;
+3. sharpness  - drop blurry frames (variance of the Laplacian);
+4. stability  - wait until STABLE_FRAMES consecutive samples barely differ
+                (the student has stopped moving the bottle);
+5. novelty    - skip scenes that already went to the model;
+
+and forwards at most FORWARD_FPS frames a second. All checks run on a 96x96
+grayscale copy, about a millisecond for a 640x480 frame. The optional tiny
+TFLite precheck (a bottle in its top 5) runs on LiveDetector's background
+thread, ahead of the full classifier, never on the frame callback.
+"""
+import functools
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+from monitoring.metrics import inc
+
+SAMPLE_FPS      = float(os.getenv("GATE_SAMPLE_FPS", "6"))
+FORWARD_FPS     = float(os.getenv("GATE_FORWARD_FPS", "1"))
+MIN_BRIGHTNESS  = float(os.getenv("GATE_MIN_BRIGHTNESS", "40"))
+MAX_BRIGHTNESS  = float(os.getenv("GATE_MAX_BRIGHTNESS", "225"))
+MIN_SHARPNESS   = float(os.getenv("GATE_MIN_SHARPNESS", "60"))
+MAX_MOTION      = float(os.getenv("GATE_MAX_MOTION", "6"))     # mean abs diff (0-255) between samples
+STABLE_FRAMES   = int(os.getenv("GATE_STABLE_FRAMES", "3"))
+MIN_CHANGE      = float(os.getenv("GATE_MIN_CHANGE", "10"))    # vs. the last forwarded frame
+TINY_MODEL_PATH = os.getenv("GATE_TINY_MODEL", "")             # e.g. model/artifacts/mobilenet_v2_int8.tflite
+
+_GATE_SIZE = (96, 96)
+
+
+class GateResult(NamedTuple):
+    forward: bool
+    reason: str  # forwarded | throttled | dark | bright | blurry | moving | unchanged | no_bottle
+
+
+@functools.lru_cache(maxsize=None)
+def tiny_bottle_check(path: str = TINY_MODEL_PATH):
+    """Optional pre-classifier: MobileNetV2 TFLite, True if 'bottle' is in its top 5 (one per process)."""
+    if not path:
+        return None
+    from model.backends import create_backend, decode_predictions
+    from model.classifier import to_input_array
+
+    backend = create_backend("tflite", "mobilenet_v2", path)
+
+    def check(img: Image.Image) -> bool:
+        decoded = decode_predictions(backend.predict(to_input_array(img)[None]), top=5)[0]
+        return any("bottle" in label.lower() for _, label, _ in decoded)
+    return check
+
+
+class FrameGate:
+    def __init__(self, sample_fps: float = SAMPLE_FPS, forward_fps: float = FORWARD_FPS,
+                 min_brightness: float = MIN_BRIGHTNESS, max_brightness: float = MAX_BRIGHTNESS,
+                 min_sharpness: float = MIN_SHARPNESS, max_motion: float = MAX_MOTION,
+                 stable_frames: int = STABLE_FRAMES, min_change: float = MIN_CHANGE):
+        self.sample_interval = 1.0 / sample_fps if sample_fps > 0 else 0.0
+        self.forward_interval = 1.0 / forward_fps if forward_fps > 0 else 0.0
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.max_motion = max_motion
+        self.stable_frames = stable_frames
+        self.min_change = min_change
+        self._last_sample = float("-inf")
+        self._last_forward = float("-inf")
+        self._prev = None        # previous sampled gray frame
+        self._forwarded = None   # gray frame last sent to the model
+        self._stable = 0
+        self.counts = {}
+
+    def reset(self):
+        """Forget the last forwarded scene (e.g. after a capture was accepted)."""
+        self._forwarded = None
+        self._stable = 0
+
+    def count(self, reason: str) -> GateResult:
+        self.counts[reason] = self.counts.get(reason, 0) + 1
+        inc("live_frames_total", result=reason)
+        return GateResult(reason == "forwarded", reason)
+
+    def check(self, frame: np.ndarray, now: Optional[float] = None) -> GateResult:
+        """Decide whether an RGB uint8 frame (H, W, 3) should go to the full classifier."""
+        now = time.monotonic() if now is None else now
+        if now - self._last_sample < self.sample_interval:
+            return self.count("throttled")
+        self._last_sample = now
+
+        step = max(1, min(frame.shape[:2]) // (2 * _GATE_SIZE[1]))  # cheap stride before the resize
+        small = np.ascontiguousarray(frame[::step, ::step])
+        gray = np.asarray(Image.fromarray(small).convert("L").resize(_GATE_SIZE, Image.BILINEAR), dtype=np.float32)
+        prev, self._prev = self._prev, gray
+
+        brightness = float(gray.mean())
+        if brightness < self.min_brightness:
+            return self.count("dark")
+        if brightness > self.max_brightness:
+            return self.count("bright")
+
+        lap = 4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1] - gray[1:-1, :-2] - gray[1:-1, 2:]
+        if float(lap.var()) < self.min_sharpness:
+            self._stable = 0
+            return self.count("blurry")
+
+        if prev is None or float(np.abs(gray - prev).mean()) > self.max_motion:
+            self._stable = 0
+            return self.count("moving")
+        self._stable += 1
+        if self._stable < self.stable_frames:
+            return self.count("moving")
+
+        if self._forwarded is not None and float(np.abs(gray - self._forwarded).mean()) < self.min_change:
+            return self.count("unchanged")
+        if now - self._last_forward < self.forward_interval:
+            return self.count("throttled")
+        self._last_forward = now
+        self._forwarded = gray
+        return self.count("forwarded")
+
+
+class LiveDetector:
+    """Per-session glue between the WebRTC frame callback and the classifier.
+
+    on_frame() runs on the WebRTC worker thread and never waits for a model:
+    a gated frame goes to a background thread (one at a time) for the optional
+    tiny precheck and then the classifier, and the first plastic bottle is kept
+    for the Streamlit script to pick up with take_hit().
+    """
+
+    def __init__(self, classify, is_accepted, gate: Optional[FrameGate] = None, precheck=None):
+        self.classify = classify        # callable(PIL image) -> (bool, decoded)
+        self.is_accepted = is_accepted  # callable(decoded) -> bool
+        self.gate = gate or FrameGate()
+        self.precheck = precheck or tiny_bottle_check()  # callable(PIL image) -> bool, or None
+        self._lock = threading.Lock()
+        self._busy = False
+        self._hit = None
+        self.last_verdict = ""
+        self.classified = 0
+
+    def on_frame(self, frame: np.ndarray):
+        with self._lock:
+            if self._busy or self._hit is not None:
+                return
+            if not self.gate.check(frame).forward:
+                return
+            self._busy = True
+        threading.Thread(target=self._classify, args=(Image.fromarray(frame),), daemon=True).start()
+
+    def _classify(self, img: Image.Image):
+        accepted, decoded, rejected_early = False, None, False
+        try:
+            # the gate has already recorded this scene as forwarded, so a rejected one is not retried
+            if self.precheck is not None and not self.precheck(img):
+                rejected_early = True
+                self.last_verdict = "no bottle"
+            else:
+                _, decoded = self.classify(img)
+                accepted = self.is_accepted(decoded)
+                self.last_verdict = "bottle" if accepted else decoded[0][1]
+        except Exception as e:
+            accepted, decoded = False, None
+            self.last_verdict = f"error: {e.__class__.__name__}"
+        with self._lock:
+            if rejected_early:
+                self.gate.count("no_bottle")
+            else:
+                self.classified += 1
+            self._busy = False
+            if accepted:
+                self._hit = (img, decoded)
+
+    def take_hit(self):
+        """(PIL image, decoded predictions) of an accepted frame, once; else None."""
+        with self._lock:
+            hit, self._hit = self._hit, None
+            if hit is not None:
+                self.gate.reset()
+            return hit
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.gate.counts, "classified": self.classified, "last": self.last_verdict}
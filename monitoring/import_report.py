@@ -0,0 +1,136 @@
+"""Cold-start import cost, from `python -X importtime`, summarized.
+
+By default measures what the first run of app.py imports before the start
+screen is drawn: the script is executed bare (no server, so no model
+warm-up) in a fresh interpreter against a throwaway database. --module
+measures a plain import instead. Each measurement is repeated and the run
+with the median total is reported: total time, time per top-level package
+(self time of all its modules), and the slowest direct imports.
+
+Usage (from the repo root):
+    python -m monitoring.import_report
+    python -m monitoring.import_report --module model.classifier
+    python -m monitoring.import_report --save import_baseline.json
+    python -m monitoring.import_report --compare import_baseline.json --threshold 0.25
+
+--compare exits with status 1 when the total is more than `threshold`
+(fraction) slower than the baseline or a package not in the baseline shows up
+above --min-ms.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_RUN_APP = "import runpy; runpy.run_path({path!r}, run_name='__main__')"
+
+
+class ImportLine(NamedTuple):
+    name: str
+    depth: int
+    self_ms: float
+    cumulative_ms: float
+
+
+def parse_importtime(stderr: str) -> List[ImportLine]:
+    """Parse `import time: <self us> | <cumulative us> | <indented name>` lines."""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header line
+        raw = parts[2].rstrip()
+        name = raw.lstrip()
+        depth = (len(raw) - len(name) - 1) // 2
+        out.append(ImportLine(name, depth, int(parts[0]) / 1000.0, int(parts[1]) / 1000.0))
+    return out
+
+
+def measure(module: str = "") -> List[ImportLine]:
+    code = f"import {module}" if module else _RUN_APP.format(path=os.path.join(ROOT, "app.py"))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "PYTHONPATH": ROOT, "RECYCLE_DB_PATH": os.path.join(tmp, "import.db"),
+               "IMG_ARCHIVE_DIR": os.path.join(tmp, "archive")}
+        res = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=tmp, env=env,
+                             capture_output=True, text=True)
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip().splitlines()[-1] if res.stderr.strip() else "import failed")
+    return parse_importtime(res.stderr)
+
+
+def summarize(lines: List[ImportLine]) -> dict:
+    packages = defaultdict(float)
+    for line in lines:
+        packages[line.name.split(".")[0]] += line.self_ms
+    direct = sorted((l for l in lines if l.depth == 0), key=lambda l: -l.cumulative_ms)
+    return {
+        "total_ms": sum(l.cumulative_ms for l in direct),
+        "modules": len(lines),
+        "packages": dict(sorted(packages.items(), key=lambda kv: -kv[1])),
+        "direct": [(l.name, l.cumulative_ms) for l in direct],
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_ms: float) -> list:
+    failures = []
+    base, cur = baseline["total_ms"], current["total_ms"]
+    print(f"total: {base:.0f} ms -> {cur:.0f} ms ({cur / base - 1:+.0%})" if base else f"total: {cur:.0f} ms")
+    if base and cur > base * (1 + threshold):
+        failures.append(f"total {base:.0f} -> {cur:.0f} ms")
+    for pkg, ms in current["packages"].items():
+        if ms >= min_ms and pkg not in baseline["packages"]:
+            failures.append(f"new package {pkg} ({ms:.0f} ms)")
+    return failures
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--module", default="", help="measure `import MODULE` instead of the app's first run")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=12)
+    ap.add_argument("--min-ms", type=float, default=5.0, help="hide (and don't gate on) smaller packages")
+    ap.add_argument("--save", default="", help="write the summary as JSON")
+    ap.add_argument("--compare", default="", help="baseline JSON from --save")
+    ap.add_argument("--threshold", type=float, default=0.25)
+    args = ap.parse_args(argv)
+
+    measure(args.module)  # compile .pyc files; not counted
+    runs = sorted((summarize(measure(args.module)) for _ in range(max(1, args.runs))), key=lambda r: r["total_ms"])
+    report = runs[len(runs) // 2]
+
+    totals = ", ".join(f"{r['total_ms']:.0f}" for r in runs)
+    print(f"{args.module or 'app.py first run'}: {report['total_ms']:.0f} ms, {report['modules']} modules "
+          f"(median of {len(runs)} runs: {totals} ms)")
+    print(f"\n{'package':<28} {'self ms':>8}")
+    for pkg, ms in list(report["packages"].items())[:args.top]:
+        if ms >= args.min_ms:
+            print(f"{pkg:<28} {ms:>8.1f}")
+    print(f"\n{'direct import':<28} {'cum. ms':>8}")
+    for name, ms in report["direct"][:args.top]:
+        if ms >= args.min_ms:
+            print(f"{name:<28} {ms:>8.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nsaved {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        failures = compare(report, baseline, args.threshold, args.min_ms)
+        for failure in failures:
+            print("REGRESSION:", failure)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""Load test of the full Streamlit flow with a fake classifier.
+
+Every virtual student is an AppTest session that runs the real app.py script
+with its own session state. It goes through start -> sign in -> dashboard ->
+new bottle -> photo -> validate -> back, and claims a ticket whenever one is
+available. Virtual teachers sign in to the admin panel, look students up,
+redeem their tickets and, every --import-every flows, upload a small CSV of
+point adjustments through the Import section. AppTest keeps global state per process, so each virtual
+user runs in its own process against the shared database, like kiosks on
+separate app instances.
+model.classifier.is_bottle is replaced by a stub that sleeps --infer-ms and
+accepts --accept-rate of the photos, so no camera, model or GPU is needed.
+
+Reports per-step latency (one step = one script run, as a browser would wait
+for it), error rates, and SQLite lock contention: busy retries and the
+latency of each repository call.
+
+Usage (from the repo root):
+    python -m monitoring.load_test --students 20 --teachers 2 --seconds 60
+    python -m monitoring.load_test --students 50 --max-p95-ms 1500 --max-error-rate 0.01   # CI gate
+
+Exits with status 1 when a --max-* limit is exceeded.
+"""
+import argparse
+import io
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from PIL import Image
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PASSCODE = os.getenv("ADMIN_PASSCODE", "teacher123")
+INITIAL_POINTS = 40
+
+BOTTLE = [("n04557648", "water_bottle", 0.82), ("n03983396", "pop_bottle", 0.09),
+          ("n03063599", "coffee_mug", 0.03), ("n07930864", "cup", 0.02), ("n04579145", "whiskey_jug", 0.01)]
+NOT_BOTTLE = [("n03063599", "coffee_mug", 0.71), ("n07930864", "cup", 0.12),
+              ("n04560804", "water_jug", 0.05), ("n03950228", "pitcher", 0.03), ("n04398044", "teapot", 0.02)]
+
+
+class FlowError(Exception):
+    """The page did not offer what the next step needs (missing button, script exception)."""
+
+
+# ---------------- STUBS ----------------
+def install_stub_classifier(infer_secs: float, accept_rate: float, seed: int = 7):
+    """Swap the model out of model.classifier; the app picks these up on its next run."""
+    import model.classifier as classifier
+
+    rnd = random.Random(seed)
+    lock = threading.Lock()
+
+    def is_bottle(source, tta: str = ""):
+        time.sleep(infer_secs)
+        with lock:
+            accepted = rnd.random() < accept_rate
+        return accepted, BOTTLE if accepted else NOT_BOTTLE
+
+    classifier.is_bottle = is_bottle
+    classifier.warm_up = lambda: None
+    classifier.model_status = lambda: "ready"
+
+
+def photo_pool(n: int, seed: int = 11) -> list:
+    """Distinct small JPEGs, so the duplicate-submission check does not kick in."""
+    rnd = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        buf = io.BytesIO()
+        Image.fromarray(rnd.integers(0, 255, (240, 320, 3), dtype=np.uint8)).save(buf, format="JPEG", quality=70)
+        out.append(buf.getvalue())
+    return out
+
+
+# ---------------- VIRTUAL USERS ----------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)  # step -> [seconds]
+        self.errors = defaultdict(int)    # step -> count
+        self.flows = 0
+
+    def add(self, step: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latency[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+
+    def flow_done(self):
+        with self._lock:
+            self.flows += 1
+
+
+class VirtualUser:
+    def __init__(self, rec: Recorder, timeout: float):
+        self.rec = rec
+        self.timeout = timeout
+        self.at = None
+
+    def step(self, name: str, *actions, expect=None):
+        """Apply `actions` to the current page, run the script and time it; `expect` checks the result."""
+        from streamlit.testing.v1 import AppTest
+
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            if self.at is None:
+                self.at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+            for action in actions:
+                action(self.at)
+            self.at.run()
+            if self.at.exception:
+                raise FlowError(self.at.exception[0].message)
+            if expect:
+                expect(self.at)
+            ok = True
+        finally:
+            self.rec.add(name, time.perf_counter() - t0, ok)
+            if not ok:
+                self.at = None  # start over with a fresh session
+
+    def button(self, label: str):
+        for b in self.at.button:
+            if b.label.startswith(label) and not b.disabled:
+                return b
+        return None
+
+    def click(self, label: str):
+        def action(at):
+            b = self.button(label)
+            if b is None:
+                raise FlowError(f"no enabled button {label!r}")
+            b.click()
+        return action
+
+    def text(self, label: str, value: str):
+        def action(at):
+            for t in at.text_input:
+                if t.label == label:
+                    t.input(value)
+                    return
+            raise FlowError(f"no text input {label!r}")
+        return action
+
+    def radio(self, label: str, value: str):
+        def action(at):
+            for r in at.radio:
+                if r.label == label:
+                    r.set_value(value)
+                    return
+            raise FlowError(f"no radio {label!r}")
+        return action
+
+    def upload(self, name: str, data: bytes, mime: str = "text/csv"):
+        def action(at):
+            if not at.file_uploader:
+                raise FlowError("no file uploader")
+            at.file_uploader[0].set_value((name, data, mime))
+        return action
+
+    def summary(self, name: str):
+        def expect(at):
+            if at.error or not any(m.value.startswith(f"{name}:") for m in at.success):
+                raise FlowError(f"no import summary for {name}")
+        return expect
+
+    def state(self, key: str, value):
+        """Stand-in for widgets AppTest cannot drive (the camera)."""
+        def action(at):
+            at.session_state[key] = value
+        return action
+
+
+class Student(VirtualUser):
+    def __init__(self, rec, timeout, user_id: str, photos: list):
+        super().__init__(rec, timeout)
+        self.user_id = user_id
+        self.photos = photos
+        self.n = 0
+
+    def flow(self):
+        if self.at is None:
+            self.step("open")
+        self.step("enter_id", self.text("🔐 Enter your ID", self.user_id))
+        self.step("sign_in", self.click("➡️ Sign in"))
+        if self.button("🎟️ Claim 1 ticket"):
+            self.step("claim", self.click("🎟️ Claim 1 ticket"))
+        self.step("new_bottle", self.click("📷 New bottle"))
+        self.n += 1
+        self.step("photo", self.state("img_bytes", self.photos[self.n % len(self.photos)]))
+        self.step("validate", self.click("✅ Validate"))
+        self.step("back", self.click("↩️ Cancel / Back"))
+
+
+class Teacher(VirtualUser):
+    def __init__(self, rec, timeout, student_ids: list, seed: int, import_every: int = 0):
+        super().__init__(rec, timeout)
+        self.student_ids = student_ids
+        self.rnd = random.Random(seed)
+        self.import_every = import_every
+        self.n = 0
+
+    def flow(self):
+        if self.at is None:
+            self.step("open")
+            self.step("admin", self.click("👨‍💼 Admin"))
+            self.step("admin_login", self.text("Passcode", PASSCODE), self.click("Sign in"))
+        user_id = self.rnd.choice(self.student_ids)
+        self.step("lookup", self.text("Student ID", user_id), self.click("Lookup"))
+        if self.button("Redeem tickets"):
+            self.step("redeem", self.click("Redeem tickets"))
+        self.n += 1
+        if self.import_every and self.n % self.import_every == 0:
+            self.import_points()
+
+    def import_points(self):
+        """Upload +1 for a few students; the page must show the summary, not an error."""
+        ids = self.rnd.sample(self.student_ids, min(3, len(self.student_ids)))
+        data = ("id,delta,note\n" + "".join(f"{u},1,load test\n" for u in ids)).encode()
+        self.step("import_open", self.radio("Section", "Import"))
+        self.step("import_kind", self.radio("Upload", "points"))
+        self.step("import_file", self.upload("adjust.csv", data))
+        self.step("import", self.click("Import"), expect=self.summary("adjust.csv"))
+        self.step("import_done", self.radio("Section", "Students"))
+
+
+def drive(user: VirtualUser, deadline: float, think_secs: float, rnd: random.Random):
+    time.sleep(rnd.random() * think_secs)  # don't start in lockstep
+    while time.monotonic() < deadline:
+        try:
+            user.flow()
+        except Exception:
+            pass  # counted by step(); the session starts over
+        else:
+            user.rec.flow_done()
+        time.sleep(think_secs * (0.5 + rnd.random()))
+
+
+def run_session(kind: str, index: int, student_ids: list, db_path: str, archive_dir: str, opts: dict,
+                ready, start, out_queue):
+    """One virtual user in its own process (AppTest keeps per-process global state)."""
+    os.environ["IMG_ARCHIVE_DIR"] = archive_dir
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+
+    from database import repository as repo
+    from monitoring.metrics import histogram_summary
+
+    repo.set_db_path(db_path)
+    install_stub_classifier(opts["infer_secs"], opts["accept_rate"], seed=index)
+    set_log_level("error")  # bare-mode and deprecation warnings on every run
+    AppTest.from_file(APP_PATH, default_timeout=opts["timeout"]).run()  # imports; not measured
+    rec = Recorder()
+    if kind == "student":
+        user = Student(rec, opts["timeout"], student_ids[index], photo_pool(16, seed=index))
+    else:
+        user = Teacher(rec, opts["timeout"], student_ids, seed=index, import_every=opts["import_every"])
+    retries0 = repo.busy_retry_count()
+    ready.put(kind)
+    start.wait()
+    drive(user, time.monotonic() + opts["seconds"], opts["think_secs"], random.Random(index))
+    db_calls = [(labels.get("fn", ""), count, mean, p95) for name, labels, count, mean, _, p95
+                in histogram_summary() if name == "db_call_seconds"]
+    out_queue.put((dict(rec.latency), dict(rec.errors), rec.flows, repo.busy_retry_count() - retries0, db_calls))
+
+
+# ---------------- REPORT ----------------
+def _pct(values, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000.0 if values else 0.0
+
+
+def report(results, seconds: float) -> tuple:
+    latency, errors, db = defaultdict(list), defaultdict(int), {}
+    flows = busy_retries = 0
+    for lat, err, n, retries, db_calls in results:
+        for step, values in lat.items():
+            latency[step].extend(values)
+        for step, count in err.items():
+            errors[step] += count
+        flows += n
+        busy_retries += retries
+        for fn, count, mean, p95 in db_calls:
+            total, secs, worst = db.get(fn, (0, 0.0, 0.0))
+            db[fn] = (total + count, secs + mean * count, max(worst, p95))
+
+    print(f"{'step':<12} {'runs':>6} {'errors':>7} {'p50':>9} {'p95':>9} {'max':>9}")
+    worst_p95 = 0.0
+    for step, values in latency.items():
+        worst_p95 = max(worst_p95, _pct(values, 95))
+        print(f"{step:<12} {len(values):>6} {errors[step]:>7} {_pct(values, 50):>7.0f}ms "
+              f"{_pct(values, 95):>7.0f}ms {max(values) * 1000:>7.0f}ms")
+    runs = sum(len(v) for v in latency.values())
+    error_rate = sum(errors.values()) / runs if runs else 0.0
+    print(f"{flows} flows, {runs} script runs in {seconds:.0f} s -> {runs / seconds:.1f} runs/s, "
+          f"error rate {error_rate:.2%}")
+
+    print(f"DB contention: {busy_retries} busy retries")
+    for fn, (count, secs, p95) in sorted(db.items(), key=lambda kv: -kv[1][2])[:8]:
+        print(f"  {fn:<22} {count:>7} calls  mean {secs / count * 1000:>6.1f} ms  p95 <= {p95 * 1000:.0f} ms")
+    return worst_p95, error_rate
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--students", type=int, default=10, help="concurrent student sessions")
+    ap.add_argument("--teachers", type=int, default=1, help="concurrent admin sessions")
+    ap.add_argument("--seconds", type=float, default=30.0)
+    ap.add_argument("--think-ms", type=float, default=300.0, help="mean pause between flows")
+    ap.add_argument("--infer-ms", type=float, default=300.0, help="stub classifier latency")
+    ap.add_argument("--accept-rate", type=float, default=0.8, help="share of photos the stub accepts")
+    ap.add_argument("--import-every", type=int, default=5, help="teacher flows per CSV import (0: never)")
+    ap.add_argument("--timeout", type=float, default=30.0, help="per script run")
+    ap.add_argument("--db", default="", help="database file or postgresql:// URL (default: a temporary file)")
+    ap.add_argument("--max-p95-ms", type=float, default=0.0, help="fail if any step's p95 is slower")
+    ap.add_argument("--max-error-rate", type=float, default=-1.0, help="fail above this error rate")
+    args = ap.parse_args(argv)
+
+    from database import repository as repo
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "load.db")
+        repo.set_db_path(db_path)
+        repo.init_db()
+        student_ids = [f"load{i:04d}" for i in range(args.students)]
+        with repo.transaction(immediate=True) as conn:
+            conn.executemany("INSERT OR IGNORE INTO users (id, name, points) VALUES (?, ?, ?)",
+                             ((u, f"Load {u}", INITIAL_POINTS) for u in student_ids))
+            conn.executemany("INSERT OR IGNORE INTO tickets (user_id, available, claimed_month, month_key) "
+                             "VALUES (?, 0, 0, '')", ((u,) for u in student_ids))
+            repo.open_balances(conn, ((u, INITIAL_POINTS, 0) for u in student_ids))
+        repo.close_all()
+
+        opts = {"infer_secs": args.infer_ms / 1000, "accept_rate": args.accept_rate, "timeout": args.timeout,
+                "seconds": args.seconds, "think_secs": args.think_ms / 1000, "import_every": args.import_every}
+        ctx = mp.get_context("spawn")
+        ready, out, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+        sessions = [("student", i) for i in range(args.students)] + [("teacher", i) for i in range(args.teachers)]
+        procs = [ctx.Process(target=run_session, daemon=True,
+                             args=(kind, i, student_ids, db_path, os.path.join(tmp, "archive"), opts, ready, start, out))
+                 for kind, i in sessions]
+        for p in procs:
+            p.start()
+        for _ in procs:
+            ready.get()
+        print(f"{args.students} students + {args.teachers} teachers for {args.seconds:.0f} s, "
+              f"stub inference {args.infer_ms:.0f} ms")
+        t0 = time.perf_counter()
+        start.set()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+        worst_p95, error_rate = report(results, time.perf_counter() - t0)
+
+    failed = False
+    if args.max_p95_ms and worst_p95 > args.max_p95_ms:
+        print(f"FAIL: slowest step p95 {worst_p95:.0f} ms > {args.max_p95_ms:.0f} ms")
+        failed = True
+    if args.max_error_rate >= 0 and error_rate > args.max_error_rate:
+        print(f"FAIL: error rate {error_rate:.2%} > {args.max_error_rate:.2%}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""In-process metrics: counters, latency histograms and Prometheus text output.
+
+Everything is process-wide (shared by all Streamlit sessions). Values can be
+read in the admin panel's Metrics tab or scraped over HTTP when METRICS_PORT
+is set (see start_http_server()).
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, Prometheus-style cumulative buckets.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 only behind a firewall / for a scraper
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> float
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_collectors = {}   # (module, qualname) -> callable returning {(name, labels): value} gauges
+_help = {}
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(BUCKETS)] += 1
+        h[-1] += seconds
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block into histogram `name` (recorded even if the block raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+def timed(name: str):
+    """Decorator: observe each call of the function into `name` with fn=<function name>."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, fn=fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_collector(fn):
+    """Add a callable returning {(name, ((label, value), ...)): number} gauges at scrape time.
+
+    Keyed by qualified name, so re-registering on every Streamlit rerun replaces
+    the previous definition instead of piling up copies.
+    """
+    with _lock:
+        _collectors[(fn.__module__, fn.__qualname__)] = fn
+    return fn
+
+
+# ---------------- READ ----------------
+def counter_value(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def histogram_summary():
+    """[(name, labels, count, mean_s, approx_p50_s, approx_p95_s)] for display."""
+    with _lock:
+        items = [(k, list(v)) for k, v in _histograms.items()]
+    out = []
+    for (name, labels), h in sorted(items):
+        count = sum(h[:-1])
+        if not count:
+            continue
+        out.append((name, dict(labels), count, h[-1] / count, _quantile(h, 0.5), _quantile(h, 0.95)))
+    return out
+
+
+def _quantile(h, q: float) -> float:
+    target = q * sum(h[:-1])
+    seen = 0
+    for i, bound in enumerate(BUCKETS):
+        seen += h[i]
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    with _lock:
+        counters = dict(_counters)
+        hists = {k: list(v) for k, v in _histograms.items()}
+        collectors = list(_collectors.values())
+    gauges = {}
+    for fn in collectors:
+        try:
+            gauges.update(fn())
+        except Exception:
+            inc("metrics_collector_errors_total")
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+    for (name, labels), h in sorted(hists.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for i, bound in enumerate(BUCKETS):
+            cumulative += h[i]
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+        cumulative += h[len(BUCKETS)]
+        lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-1]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- HTTP ----------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serve /metrics on host:port from a daemon thread (once per process; port 0 disables)."""
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            return None  # another process on this host already serves the port
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -0,0 +1,91 @@
+"""One-shot profiling of a single Streamlit run.
+
+Enable from the admin Metrics section: "profile next request" applies to the
+next run of any session, and the URL switch (?profile=1 on a request) is
+honoured only while an admin has allowed it there, so kiosk users can't turn
+the profiler on.
+Uses pyinstrument when installed, otherwise cProfile.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_busy = threading.Lock()  # one profiler at a time per process
+_pending = 0
+_url_allowed = False  # ?profile=1, toggled by an admin
+_profiles = deque(maxlen=5)  # (timestamp, label, text)
+
+
+def request_profile(runs: int = 1):
+    global _pending
+    with _lock:
+        _pending += runs
+
+
+def allow_url_profiling(allowed: bool):
+    global _url_allowed
+    with _lock:
+        _url_allowed = bool(allowed)
+
+
+def url_profiling_allowed() -> bool:
+    with _lock:
+        return _url_allowed
+
+
+def _take_pending() -> bool:
+    global _pending
+    with _lock:
+        if _pending > 0:
+            _pending -= 1
+            return True
+        return False
+
+
+def _record(label: str, text: str):
+    # called from `finally`: st.rerun()/st.stop() end a run by raising
+    with _lock:
+        _profiles.append((time.strftime("%Y-%m-%d %H:%M:%S"), label, text))
+
+
+def recent_profiles():
+    with _lock:
+        return list(_profiles)
+
+
+@contextmanager
+def profile_run(url_requested: bool = False, label: str = ""):
+    """Profile this run if an admin queued it, or if the URL asked and an admin allowed that."""
+    if not ((url_requested and url_profiling_allowed()) or _take_pending()) or not _busy.acquire(blocking=False):
+        yield
+        return
+    try:
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        if Profiler is not None:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                _record(label, profiler.output_text(unicode=True, color=False))
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+                _record(label, out.getvalue())
+    finally:
+        _busy.release()
@@ -0,0 +1,137 @@
+"""Background archival of annotated captures.
+
+The capture view hands the annotated PIL image to ImageArchiver.submit() and
+moves on; a single writer thread encodes it (JPEG or WebP) in memory, puts it
+and an optional thumbnail into the blob store (storage/blobs.py, local files
+or the shared database), links the blob key to its history row and
+periodically enforces the retention policy. Nothing touches a temp file.
+
+Keys are sharded by capture date, YYYY/MM/DD/<sha256>.jpg (thumbnails under
+thumbs/YYYY/MM/DD/), so the archive can still be browsed by day.
+"""
+import io
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from storage.blobs import blob_key, get_blob_store
+
+ARCHIVE_FORMAT   = os.getenv("IMG_ARCHIVE_FORMAT", "jpeg").lower()   # jpeg | webp
+ARCHIVE_QUALITY  = int(os.getenv("IMG_ARCHIVE_QUALITY", "80"))
+THUMB_SIZE       = int(os.getenv("IMG_ARCHIVE_THUMB", "256"))         # 0 disables thumbnails
+RETENTION_DAYS   = float(os.getenv("IMG_RETENTION_DAYS", "90"))       # 0 keeps forever
+RETENTION_MAX_MB = float(os.getenv("IMG_RETENTION_MAX_MB", "1024"))   # 0 = no size cap
+RETENTION_EVERY  = 50  # writes between retention sweeps
+
+_EXT = {"jpeg": "jpg", "webp": "webp"}
+
+
+class ImageArchiver:
+    def __init__(self, store=None, fmt: str = ARCHIVE_FORMAT, quality: int = ARCHIVE_QUALITY,
+                 thumb_size: int = THUMB_SIZE, retention_days: float = RETENTION_DAYS,
+                 max_total_mb: float = RETENTION_MAX_MB, on_saved=None, max_pending: int = 64):
+        if fmt not in _EXT:
+            raise ValueError(f"Unsupported archive format: {fmt}")
+        self.store = store or get_blob_store()
+        self.fmt = fmt
+        self.quality = quality
+        self.thumb_size = thumb_size
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_mb * 1024 * 1024
+        self.on_saved = on_saved  # callback(history_id, blob key) once the image is stored
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.deleted = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="image-archiver", daemon=True)
+        self._thread.start()
+        self._queue.put(None)  # sweep once at start-up
+
+    def submit(self, img, history_id=None) -> bool:
+        """Queue an image for storing; False if it was dropped (queue full)."""
+        try:
+            self._queue.put_nowait((img, history_id))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1  # never block the request path on storage I/O
+            return False
+        return True
+
+    def flush(self, timeout: float = 10.0):
+        """Wait until queued images are written (tests, shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    # ---------- worker ----------
+    def _run(self):
+        since_sweep = 0
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    self.enforce_retention()
+                    continue
+                self._write(*job)
+                since_sweep += 1
+                if since_sweep >= RETENTION_EVERY:
+                    since_sweep = 0
+                    self.enforce_retention()
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+            finally:
+                self._queue.task_done()
+
+    def _encode(self, img, **options) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format=self.fmt.upper(), quality=self.quality, **options)
+        return buf.getvalue()
+
+    def _write(self, img, history_id):
+        img = img.convert("RGB") if img.mode != "RGB" else img
+        ext = _EXT[self.fmt]
+        data = self._encode(img, optimize=self.fmt == "jpeg")
+        key = self.store.put(data, ext, key=blob_key(data, ext, day=datetime.now().strftime("%Y/%m/%d")))
+        if self.thumb_size:
+            thumb = img.copy()
+            thumb.thumbnail((self.thumb_size, self.thumb_size))
+            self.store.put(self._encode(thumb), ext, key=thumb_key(key))
+        with self._lock:
+            self.written += 1
+        if history_id is not None and self.on_saved is not None:
+            self.on_saved(history_id, key)
+
+    def enforce_retention(self):
+        """Delete images older than retention_days, then oldest-first down to the size cap."""
+        removed = self.store.prune(self.retention_days, self.max_total_bytes)
+        with self._lock:
+            self.deleted += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._queue.qsize(), "written": self.written, "dropped": self.dropped,
+                    "deleted": self.deleted, "errors": self.errors}
+
+
+def thumb_key(key: str) -> str:
+    """Blob key of the thumbnail stored alongside image `key`."""
+    return f"thumbs/{key}"
+
+
+_archiver = None
+_archiver_lock = threading.Lock()
+
+
+def get_archiver(on_saved=None) -> ImageArchiver:
+    """Process-wide archiver (one writer thread shared by all sessions)."""
+    global _archiver
+    with _archiver_lock:
+        if _archiver is None:
+            _archiver = ImageArchiver(on_saved=on_saved)
+        return _archiver
@@ -0,0 +1,137 @@
+"""Content-addressed image storage shared by every app instance.
+
+A blob's key is derived from the SHA-256 of its bytes (ab/cd/abcd....jpg), so
+identical images are stored once, keys never collide across kiosks, and any
+instance can read what another wrote. Archived captures are filed by day
+instead (YYYY/MM/DD/abcd....jpg, see storage/archive.py), which keeps the
+browse-by-date layout; identical bytes are then stored once per day. Two
+stores, chosen with IMG_STORE:
+
+    local  files under IMG_ARCHIVE_DIR (default); for several hosts, point it
+           at a shared mount
+    db     the `blobs` table of the app database (SQLite or Postgres), for
+           hosts that share only the database
+
+Putting bytes that already exist refreshes their timestamp, so retention
+(prune) keeps whatever was referenced recently.
+"""
+import hashlib
+import os
+import threading
+import time
+
+IMG_STORE   = os.getenv("IMG_STORE", "local").lower()   # local | db
+ARCHIVE_DIR = os.getenv("IMG_ARCHIVE_DIR", os.path.join("images", "archive"))
+
+
+def blob_key(data: bytes, ext: str, day: str = "") -> str:
+    """SHA-256-derived key; with `day` ("YYYY/MM/DD") it is filed under that date."""
+    digest = hashlib.sha256(data).hexdigest()
+    if day:
+        return f"{day}/{digest}.{ext}"
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+class LocalBlobStore:
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, data: bytes, ext: str, key: str = "") -> str:
+        """Store `data`; returns its key (content-derived unless `key` is given)."""
+        key = key or blob_key(data, ext)
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # readers never see half-written files
+        return key
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def prune(self, max_age_days: float = 0, max_total_bytes: float = 0) -> int:
+        """Delete blobs older than max_age_days, then oldest-first down to the size cap."""
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            too_old = max_age_days and now - mtime > max_age_days * 86400
+            too_big = max_total_bytes and total > max_total_bytes
+            if not (too_old or too_big):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+class DbBlobStore:
+    """Blobs in the app database; works wherever the database is reachable."""
+
+    def put(self, data: bytes, ext: str, key: str = "") -> str:
+        from database.repository import put_blob
+
+        key = key or blob_key(data, ext)
+        put_blob(key, data, time.time())
+        return key
+
+    def get(self, key: str) -> bytes:
+        from database.repository import get_blob
+
+        data = get_blob(key)
+        if data is None:
+            raise FileNotFoundError(key)
+        return data
+
+    def exists(self, key: str) -> bool:
+        from database.repository import get_blob
+
+        return get_blob(key) is not None
+
+    def prune(self, max_age_days: float = 0, max_total_bytes: float = 0) -> int:
+        from database.repository import prune_blobs
+
+        cutoff = time.time() - max_age_days * 86400 if max_age_days else 0
+        return prune_blobs(cutoff, int(max_total_bytes))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Process-wide store selected by IMG_STORE."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if IMG_STORE == "local":
+                _store = LocalBlobStore()
+            elif IMG_STORE == "db":
+                _store = DbBlobStore()
+            else:
+                raise ValueError(f"Unknown IMG_STORE: {IMG_STORE}")
+        return _store